@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for the FR adapter's HTML parsing.
+
+Compares the previous BeautifulSoup implementation of _extract_results_from_search
+and _maybe_extract_docs with the current streaming lxml path on the pages in
+fixtures/fr/: parse time (best of N) and peak RSS growth (each variant measured in
+a fresh subprocess, since lxml allocations are invisible to tracemalloc). Also
+checks that both produce the same output.
+
+    python benchmarks/bench_fr_parse.py [--repeat 200] [--limit 15] [--json]
+"""
+from __future__ import annotations
+import argparse
+import importlib
+import json
+import resource
+import subprocess
+import sys
+import time
+from pathlib import Path
+from urllib.parse import urljoin
+
+ROOT = Path(__file__).resolve().parent
+sys.path.insert(0, str(ROOT.parent))
+FIXTURES = ROOT / "fixtures" / "fr"
+SEARCH_PAGES = sorted(FIXTURES.glob("search_*.html"))
+DETAIL_PAGES = sorted(FIXTURES.glob("detail_*.html"))
+
+from medreg.adapters import fr  # noqa: E402
+
+def legacy_extract_results(html: str, limit: int) -> list:
+    # Pre-streaming implementation (BeautifulSoup tree, dedup after the scan).
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, "lxml")
+    results = []
+    for a in soup.find_all("a", href=True):
+        href = a["href"]
+        text = a.get_text(strip=True)
+        if not text:
+            continue
+        if "affichageDoc.php" in href or "extrait.php" in href or "fiche" in href:
+            url = urljoin(fr.BASE, href)
+            if "telechargement" in href.lower():
+                continue
+            if text and len(text) >= 3:
+                results.append({"product_name": text, "detail_url": url})
+        if len(results) >= limit:
+            break
+    seen = set()
+    uniq = []
+    for r in results:
+        if r["detail_url"] not in seen:
+            uniq.append(r)
+            seen.add(r["detail_url"])
+    return uniq[:limit]
+
+def legacy_extract_docs(html: str) -> dict:
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, "lxml")
+    out = {}
+    for a in soup.find_all("a", href=True):
+        label = a.get_text(" ", strip=True)
+        href = a["href"]
+        low = label.lower()
+        if "rcp" in low or "caractéristiques du produit" in low or "résumé" in low:
+            out["spc_url"] = urljoin(fr.BASE, href)
+        if "notice" in low or "PIL" in low or "notice patient" in low:
+            out["pil_url"] = urljoin(fr.BASE, href)
+    return out
+
+VARIANTS = {
+    ("search", "legacy"): lambda html, limit: legacy_extract_results(html, limit),
+    ("search", "stream"): lambda html, limit: fr._extract_results_from_search(html, limit),
+    ("detail", "legacy"): lambda html, limit: legacy_extract_docs(html),
+    ("detail", "stream"): lambda html, limit: fr._maybe_extract_docs(html),
+}
+
+def _pages(kind: str) -> list[Path]:
+    return SEARCH_PAGES if kind == "search" else DETAIL_PAGES
+
+def best_time(fn, html: str, limit: int, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(html, limit)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+def peak_rss_kb(kind: str, variant: str, limit: int) -> int:
+    """Max RSS growth (KiB) of one parse per page, measured in a fresh interpreter."""
+    out = subprocess.run(
+        [sys.executable, __file__, "--rss-probe", kind, variant, "--limit", str(limit)],
+        check=True, capture_output=True, text=True,
+    )
+    return int(out.stdout.strip())
+
+def _high_water_kb() -> int:
+    # VmHWM belongs to the current address space; ru_maxrss would carry over the
+    # parent's peak across fork+exec on Linux.
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def rss_probe(kind: str, variant: str, limit: int) -> None:
+    fn = VARIANTS[(kind, variant)]
+    htmls = [p.read_text(encoding="utf-8") for p in _pages(kind)]
+    importlib.import_module("bs4")  # import cost is not part of the measurement
+    before = _high_water_kb()
+    for html in htmls:
+        fn(html, limit)
+    print(_high_water_kb() - before)
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--repeat", type=int, default=200)
+    ap.add_argument("--limit", type=int, default=15)
+    ap.add_argument("--json", action="store_true", help="Emit machine-readable results")
+    ap.add_argument("--rss-probe", nargs=2, metavar=("KIND", "VARIANT"), help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.rss_probe:
+        rss_probe(*args.rss_probe, limit=args.limit)
+        return 0
+
+    rows = []
+    mismatches = 0
+    for kind in ("search", "detail"):
+        for page in _pages(kind):
+            html = page.read_text(encoding="utf-8")
+            legacy = VARIANTS[(kind, "legacy")]
+            stream = VARIANTS[(kind, "stream")]
+            if kind == "search":
+                # Legacy de-duplicated after truncating, so compare against its full de-duplicated list.
+                same = stream(html, args.limit) == legacy(html, 10 ** 9)[: args.limit]
+            else:
+                same = stream(html, args.limit) == legacy(html, args.limit)
+            mismatches += not same
+            for variant in ("legacy", "stream"):
+                rows.append({
+                    "page": page.name,
+                    "kind": kind,
+                    "variant": variant,
+                    "best_ms": round(best_time(VARIANTS[(kind, variant)], html, args.limit, args.repeat) * 1000, 3),
+                    "peak_rss_kb": peak_rss_kb(kind, variant, args.limit),
+                    "same_output": same,
+                })
+
+    if args.json:
+        print(json.dumps({"benchmark": "fr_parse", "limit": args.limit, "results": rows}, indent=2))
+    else:
+        print(f"{'page':28} {'variant':8} {'best ms':>9} {'peak RSS KiB':>13}  same output")
+        for r in rows:
+            print(f"{r['page']:28} {r['variant']:8} {r['best_ms']:9.3f} {r['peak_rss_kb']:13d}  {r['same_output']}")
+    return 1 if mismatches else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
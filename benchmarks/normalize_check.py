@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Regression check for query normalization (medreg.normalize).
+
+Strips salts from INN spellings in each registry language and Latin, and learns
+INN/brand terms from the PL search fixture (and none from rows without an INN); exits 1 on any mismatch:
+
+    python benchmarks/normalize_check.py
+"""
+from __future__ import annotations
+import json
+import sys
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+sys.path.insert(0, str(HERE.parent))
+
+from medreg.adapters import pl  # noqa: E402
+from medreg.normalize import strip_salts, terms_from_results  # noqa: E402
+
+# query -> strip_salts() result
+STRIP_CASES = {
+    "Tramadolhydrochlorid": "tramadol",
+    "tramadolu chlorowodorek": "tramadol",
+    "Tramadoli hydrochloridum": "tramadol",
+    "chlorhydrate de tramadol": "tramadol",
+    "tramadol hydrochloride": "tramadol",
+    "Amlodipini besilas": "amlodipin",
+    "amlodipine besylate": "amlodipine",
+    "Rocuronii bromidum": "rocuronium",
+    "Diclofenacum natricum": "diclofenac",
+    "Paracetamolum": "paracetamol",
+    "Valium": "valium",
+    "tramadol 50 mg": "tramadol 50 mg",
+}
+# Terms the PL tramadol fixture must (and must not) teach the INN index
+PL_TERMS = {"tramadol", "paracetamol", "tramal", "poltram"}
+PL_NOT_TERMS = {"tramadoli", "hydrochloridum", "paracetamolum"}
+# Listing rows without an INN (navigation links on the FR results page) teach nothing
+NAV_RESULTS = [{"product_name": "Mentions légales", "inn": None}, {"product_name": "Accessibilité"}]
+
+def main() -> int:
+    failures = []
+    for query, expected in STRIP_CASES.items():
+        got = strip_salts(query)
+        if got != expected:
+            failures.append(f"strip_salts({query!r}) = {got!r}, expected {expected!r}")
+
+    data = json.loads((HERE / "fixtures" / "pl" / "search_tramadol.json").read_text(encoding="utf-8"))
+    terms = terms_from_results(pl._entry_from_item(item) for item in pl._items(data))
+    failures += [f"PL fixture: {t!r} not learned" for t in sorted(PL_TERMS - terms)]
+    failures += [f"PL fixture: {t!r} learned" for t in sorted(PL_NOT_TERMS & terms)]
+    nav_terms = terms_from_results(NAV_RESULTS)
+    if nav_terms:
+        failures.append(f"navigation links learned: {sorted(nav_terms)}")
+
+    for f in failures:
+        print(f"FAIL {f}")
+    print(f"normalize: {len(STRIP_CASES) + len(PL_TERMS) + len(PL_NOT_TERMS) + 1 - len(failures)} ok, "
+          f"{len(failures)} failed")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
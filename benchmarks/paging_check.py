@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Regression check for paged result listings against the stand-in registries.
+
+A result page that fails must fail the search (SearchError) instead of returning
+a shorter listing, and `medreg sync` must then leave the snapshot alone rather
+than report the missing products as removed. Exits 1 on any mismatch:
+
+    python benchmarks/paging_check.py
+"""
+from __future__ import annotations
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+sys.path.insert(0, str(HERE.parent))
+sys.path.insert(0, str(HERE))
+os.environ["MEDREG_CACHE_DIR"] = tempfile.mkdtemp(prefix="medreg-paging-")
+
+from standin import Behaviour, StandinServer, point_adapters_at  # noqa: E402
+from medreg.adapters import SearchError, get_adapter  # noqa: E402
+from medreg.sync import Snapshot, sync_query  # noqa: E402
+from medreg.utils import cache, http  # noqa: E402
+
+LIMIT = 200
+# Second result page of each registry (FR numbers pages from 1, the PL API from 0)
+SECOND_PAGE = {"fr": 2, "pl": 1}
+
+def main() -> int:
+    behaviour = Behaviour(retry_after=0)
+    server = StandinServer(behaviour=behaviour).start()
+    point_adapters_at(server.url)
+    http.BACKOFF_FACTOR = 0.0
+    cache.configure(enabled=False)  # every listing must reach the stand-in
+    failures = []
+    checks = 0
+    for country, page in SECOND_PAGE.items():
+        adapter = get_adapter(country)
+        snapshot = Snapshot(Path(os.environ["MEDREG_CACHE_DIR"]) / f"snapshot-{country}.json")
+        checks += 4
+        behaviour.fail_pages = frozenset()
+        listed = adapter.list_results(query="paracetamol", timeout=5, limit=LIMIT)
+        if len(listed) != LIMIT:
+            failures.append(f"{country}: healthy listing has {len(listed)} results, expected {LIMIT}")
+        sync_query(snapshot, country, "paracetamol", timeout=5, limit=LIMIT)
+        before = dict(snapshot.queries)
+
+        behaviour.fail_pages = frozenset({page})
+        try:
+            listed = adapter.list_results(query="paracetamol", timeout=5, limit=LIMIT)
+            failures.append(f"{country}: page {page} failed but the listing returned {len(listed)} results")
+        except SearchError:
+            pass
+        try:
+            diff, _ = sync_query(snapshot, country, "paracetamol", timeout=5, limit=LIMIT)
+            removed = sum(1 for d in diff if d["change"] == "removed")
+            failures.append(f"{country}: sync went through a failed page ({removed} reported removed)")
+        except SearchError:
+            pass
+        if snapshot.queries != before:
+            failures.append(f"{country}: snapshot changed after a failed page")
+
+    for f in failures:
+        print(f"FAIL {f}")
+    print(f"paging: {checks - len(failures)} ok, {len(failures)} failed")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark suite: runs the adapters and the CLI against the local
+stand-in server (standin.py) serving the recorded fixtures.
+
+Per scenario it reports end-to-end latency percentiles, requests issued per
+search, parse throughput and peak RSS (each scenario runs in its own
+interpreter, with MEDREG_CACHE_DIR pointed at a temporary directory so runs
+neither read nor write the real vocabulary, latency and cache files). Results
+can be written as JSON and compared between commits:
+
+    python benchmarks/run.py --latency-ms 50 --output before.json
+    ... change things ...
+    python benchmarks/run.py --latency-ms 50 --output after.json --compare before.json
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent
+REPO = ROOT.parent
+sys.path.insert(0, str(REPO))
+sys.path.insert(0, str(ROOT))
+
+from standin import Behaviour, StandinServer, point_adapters_at  # noqa: E402
+
+SCENARIOS = ("fr", "pl", "de", "cli")
+QUERIES = {"fr": "paracetamol", "pl": "tramadol", "de": "tramadol"}
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    k = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[k]
+
+def summarize(latencies: list[float]) -> dict:
+    ms = [x * 1000 for x in latencies]
+    return {
+        "n": len(ms),
+        "p50_ms": round(percentile(ms, 50), 2),
+        "p90_ms": round(percentile(ms, 90), 2),
+        "p99_ms": round(percentile(ms, 99), 2),
+        "max_ms": round(max(ms), 2) if ms else None,
+    }
+
+def high_water_kb() -> int:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def parse_throughput() -> dict:
+    """MB/s of the FR parsers over the recorded pages (no network)."""
+    from medreg.adapters import fr
+    out = {}
+    for name, fn in (("fr_search_page", lambda h: fr._extract_results_from_search(h, 10 ** 6)),
+                     ("fr_detail_page", fr._maybe_extract_docs)):
+        path = ROOT / "fixtures" / "fr" / ("search_paracetamol.html" if "search" in name else "detail_doliprane.html")
+        html = path.read_text(encoding="utf-8")
+        reps = 0
+        t0 = time.perf_counter()
+        while time.perf_counter() - t0 < 0.5:
+            fn(html)
+            reps += 1
+        elapsed = time.perf_counter() - t0
+        out[name] = {"mb_per_s": round(len(html.encode()) * reps / elapsed / 1e6, 2), "pages_per_s": round(reps / elapsed, 1)}
+    return out
+
+def child(scenario: str, url: str, iterations: int, limit: int, timeout: float) -> dict:
+    """Runs inside a fresh interpreter; prints one JSON document."""
+    from medreg.adapters import get_adapter
+    from medreg.utils import cache as http_cache
+    http_cache.configure(enabled=False)
+    point_adapters_at(url)
+    adapter = get_adapter(scenario)
+    if scenario == "de":
+        try:
+            import playwright  # noqa: F401
+        except ImportError:
+            return {"skipped": "playwright not installed"}
+    latencies, sizes, errors = [], [], 0
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        try:
+            results = adapter.search(query=QUERIES[scenario], timeout=timeout, browser=scenario == "de",
+                                     lang=None, limit=limit)
+            sizes.append(len(results))
+        except Exception as e:
+            errors += 1
+            last_error = str(e)
+        latencies.append(time.perf_counter() - t0)
+    from medreg.utils.http import pool_stats
+    conns = sum(s["connections"] for s in pool_stats().values())
+    out = {"latency": summarize(latencies), "results_per_search": max(sizes) if sizes else 0,
+           "errors": errors, "peak_rss_kb": high_water_kb(), "connections_opened": conns}
+    if errors:
+        out["last_error"] = last_error
+    if scenario == "fr":
+        out["parse"] = parse_throughput()
+    return out
+
+def run_child(scenario: str, server: StandinServer, args, env: dict) -> dict:
+    proc = subprocess.run(
+        [sys.executable, __file__, "--child", scenario, "--url", server.url, "--iterations", str(args.iterations),
+         "--limit", str(args.limit), "--timeout", str(args.timeout)],
+        capture_output=True, text=True, cwd=str(REPO), env=env,
+    )
+    if proc.returncode != 0:
+        return {"failed": proc.stderr.strip().splitlines()[-1:] or ["unknown error"]}
+    return json.loads(proc.stdout)
+
+def run_cli(server: StandinServer, args, env: dict) -> dict:
+    """End-to-end CLI invocations (interpreter start + imports + search), FR adapter."""
+    code = (
+        "import sys; sys.path.insert(0, sys.argv[1]); sys.path.insert(0, sys.argv[2]);"
+        "from standin import point_adapters_at; point_adapters_at(sys.argv[3]);"
+        "from medreg.cli import main; raise SystemExit(main(sys.argv[4:]))"
+    )
+    latencies, failures = [], 0
+    for _ in range(args.iterations):
+        t0 = time.perf_counter()
+        proc = subprocess.run(
+            [sys.executable, "-c", code, str(REPO), str(ROOT), server.url, "--json", "--no-daemon", "--no-cache",
+             "--limit", str(args.limit), "--timeout", str(args.timeout), "-fr", QUERIES["fr"]],
+            capture_output=True, text=True, env=env,
+        )
+        latencies.append(time.perf_counter() - t0)
+        failures += proc.returncode != 0
+    return {"latency": summarize(latencies), "errors": failures}
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=str(REPO), capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(current: dict, baseline: dict) -> None:
+    print("\nChange vs baseline " + str(baseline.get("revision")))
+    for name, cur in current["scenarios"].items():
+        old = baseline.get("scenarios", {}).get(name, {})
+        for key in ("p50_ms", "p90_ms", "p99_ms"):
+            a = old.get("latency", {}).get(key)
+            b = cur.get("latency", {}).get(key)
+            if a and b:
+                print(f"  {name:4} {key:7} {a:9.1f} -> {b:9.1f} ms  ({(b - a) / a * 100:+.1f}%)")
+        a, b = old.get("requests_per_search"), cur.get("requests_per_search")
+        if a is not None and b is not None:
+            print(f"  {name:4} requests/search {a} -> {b}")
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Offline medreg benchmarks against recorded fixtures.")
+    ap.add_argument("--scenario", action="append", choices=SCENARIOS, help="Run only these (default: all)")
+    ap.add_argument("--iterations", type=int, default=20)
+    ap.add_argument("--limit", type=int, default=15)
+    ap.add_argument("--timeout", type=float, default=10.0)
+    ap.add_argument("--latency-ms", type=float, default=30.0, help="Simulated server latency per request")
+    ap.add_argument("--jitter-ms", type=float, default=10.0)
+    ap.add_argument("--rate", type=float, default=0.0, help="Throttle to N req/s with 429 + Retry-After")
+    ap.add_argument("--body-kbps", type=float, default=0.0, help="Trickle bodies at this KiB/s")
+    ap.add_argument("--json", action="store_true", help="Print results as JSON")
+    ap.add_argument("--output", help="Also write JSON results to this file")
+    ap.add_argument("--compare", help="Baseline JSON file to compare against")
+    ap.add_argument("--child", help=argparse.SUPPRESS)
+    ap.add_argument("--url", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child:
+        print(json.dumps(child(args.child, args.url, args.iterations, args.limit, args.timeout)))
+        return 0
+
+    behaviour = Behaviour(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, rate=args.rate, body_kbps=args.body_kbps)
+    server = StandinServer(behaviour=behaviour).start()
+    report = {
+        "revision": git_revision(),
+        "python": sys.version.split()[0],
+        "settings": {k: getattr(args, k) for k in ("iterations", "limit", "timeout", "latency_ms", "jitter_ms", "rate", "body_kbps")},
+        "scenarios": {},
+    }
+    with tempfile.TemporaryDirectory(prefix="medreg-bench-") as cache_dir:
+        env = dict(os.environ, MEDREG_CACHE_DIR=cache_dir)
+        for scenario in args.scenario or SCENARIOS:
+            server.reset_counts()
+            result = run_cli(server, args, env) if scenario == "cli" else run_child(scenario, server, args, env)
+            traffic = server.snapshot()
+            result["requests"] = traffic["requests"]
+            result["requests_per_search"] = round(traffic["total"] / max(1, args.iterations), 2)
+            result["bytes_per_search"] = traffic["bytes"] // max(1, args.iterations)
+            report["scenarios"][scenario] = result
+    server.shutdown()
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"medreg benchmarks @ {report['revision']}  (latency {args.latency_ms} ms, {args.iterations} iterations)")
+        for name, r in report["scenarios"].items():
+            if "skipped" in r or "failed" in r:
+                print(f"  {name:4} {r.get('skipped') or r.get('failed')}")
+                continue
+            lat = r["latency"]
+            line = (f"  {name:4} p50 {lat['p50_ms']:8.1f} ms  p90 {lat['p90_ms']:8.1f} ms  p99 {lat['p99_ms']:8.1f} ms"
+                    f"  req/search {r['requests_per_search']:6}")
+            if r.get("connections_opened"):
+                line += f"  conns {r['connections_opened']}"
+            if "peak_rss_kb" in r:
+                line += f"  peak RSS {r['peak_rss_kb'] / 1024:.1f} MiB"
+            if r.get("errors"):
+                line += f"  errors {r['errors']}"
+            print(line)
+            for pname, p in r.get("parse", {}).items():
+                print(f"       {pname}: {p['mb_per_s']} MB/s ({p['pages_per_s']} pages/s)")
+    if args.compare:
+        compare(report, json.loads(Path(args.compare).read_text()))
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
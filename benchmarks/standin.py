@@ -0,0 +1,257 @@
+"""
+Local stand-in for the FR, PL and DE registries, serving the recorded pages in
+fixtures/. It can add latency, throttle with 429 + Retry-After, and trickle
+response bodies, so adapters can be benchmarked without touching live sites.
+
+    python benchmarks/standin.py --port 8800 --latency-ms 80 --rate 20 --body-kbps 256
+
+Routes (all relative to the server root):
+  FR  GET  /fr/recherche-de-specialites      search results page (page=N: same page, other specids)
+      GET  /fr/extrait.php?specid=N          detail page
+      GET  /fr/affichageDoc.php?...          small PDF body (ETag, Range/If-Range)
+  PL  POST /pl/api/rpl/public/medicinal-products/search   (page/size over PL_SEARCH_TOTAL products)
+      GET  /pl/api/rpl/medicinal-products/<id>[/documents]
+  DE  GET  /de/landing.html, /de/search.html, /de/results.html
+GET replies carry an ETag and answer If-None-Match with 304.
+"""
+from __future__ import annotations
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+PDF_BODY = b"%PDF-1.4\n" + b"0" * 32 * 1024 + b"\n%%EOF\n"
+# The PL search fixture's products repeated under new ids, to exercise paging
+PL_SEARCH_TOTAL = 200
+PL_MAX_PAGE_SIZE = 100
+
+class Behaviour:
+    """Knobs for simulated registry behaviour; safe to change while the server runs."""
+
+    def __init__(self, *, latency_ms: float = 0.0, jitter_ms: float = 0.0, rate: float = 0.0,
+                 burst: int = 10, body_kbps: float = 0.0, error_rate: float = 0.0, retry_after: float = 1.0,
+                 fail_pages: frozenset = frozenset()):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.rate = rate              # requests/second allowed before answering 429 (0 = unlimited)
+        self.burst = burst
+        self.body_kbps = body_kbps    # trickle bodies at this rate (0 = full speed)
+        self.error_rate = error_rate  # fraction of requests answered with 503
+        self.retry_after = retry_after
+        self.fail_pages = fail_pages  # FR/PL search pages (their `page` parameter) answered with 503
+        self._tokens = float(burst)
+        self._refilled = time.monotonic()
+        self._lock = threading.Lock()
+
+    def admit(self) -> bool:
+        if self.rate <= 0:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._refilled) * self.rate)
+            self._refilled = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+class StandinServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address=("127.0.0.1", 0), behaviour: Behaviour | None = None):
+        super().__init__(address, _Handler)
+        self.behaviour = behaviour or Behaviour()
+        self.counts: Counter = Counter()
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+        self.fr_search = (FIXTURES / "fr" / "search_paracetamol.html").read_bytes()
+        self.fr_detail = (FIXTURES / "fr" / "detail_doliprane.html").read_text(encoding="utf-8")
+        self.pl_items = json.loads((FIXTURES / "pl" / "search_tramadol.json").read_bytes())["content"]
+        self.pl_product = (FIXTURES / "pl" / "product.json").read_text(encoding="utf-8")
+        self.pl_documents = (FIXTURES / "pl" / "documents.json").read_text(encoding="utf-8")
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def start(self) -> "StandinServer":
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def pl_search_page(self, qs: dict) -> bytes:
+        page = int((qs.get("page") or ["0"])[0])
+        size = min(int((qs.get("size") or ["20"])[0]), PL_MAX_PAGE_SIZE)
+        n = len(self.pl_items)
+        content = []
+        for i in range(page * size, min((page + 1) * size, PL_SEARCH_TOTAL)):
+            item = dict(self.pl_items[i % n])
+            item["id"] = int(item["id"]) + (i // n) * 100000
+            content.append(item)
+        doc = {"content": content, "totalElements": PL_SEARCH_TOTAL, "totalPages": -(-PL_SEARCH_TOTAL // size),
+               "number": page, "size": size}
+        return json.dumps(doc, ensure_ascii=False).encode("utf-8")
+
+    def count(self, route: str, nbytes: int = 0) -> None:
+        with self._lock:
+            self.counts[route] += 1
+            self.bytes_sent += nbytes
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"requests": dict(self.counts), "total": sum(self.counts.values()), "bytes": self.bytes_sent}
+
+    def reset_counts(self) -> None:
+        with self._lock:
+            self.counts.clear()
+            self.bytes_sent = 0
+
+class _Handler(BaseHTTPRequestHandler):
+    server: StandinServer
+    protocol_version = "HTTP/1.1"
+    # Send headers and body together; separate small writes hit delayed-ACK stalls on keep-alive
+    wbufsize = 64 * 1024
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        self._dispatch("POST")
+
+    def _dispatch(self, method: str):
+        b = self.server.behaviour
+        url = urlsplit(self.path)
+        route, body, ctype = self._route(method, url.path, parse_qs(url.query))
+        if b.latency_ms or b.jitter_ms:
+            time.sleep(max(0.0, b.latency_ms + random.uniform(-b.jitter_ms, b.jitter_ms)) / 1000)
+        if not b.admit():
+            self.server.count("throttled")
+            self._reply(429, b"rate limited", "text/plain", extra={"Retry-After": f"{b.retry_after:g}"})
+            return
+        failed_page = route in ("fr_search", "pl_search") and int((parse_qs(url.query).get("page") or ["-1"])[0]) in b.fail_pages
+        if failed_page or (b.error_rate and random.random() < b.error_rate):
+            self.server.count("errors")
+            self._reply(503, b"unavailable", "text/plain")
+            return
+        if body is None:
+            self.server.count("not_found")
+            self._reply(404, b"not found", "text/plain")
+            return
+        extra = {}
+        status = 200
+        if route == "fr_document":
+            # Documents support resumable downloads: ETag + Range/If-Range
+            etag = '"doc-%d"' % len(body)
+            extra = {"ETag": etag, "Accept-Ranges": "bytes"}
+            m = re.fullmatch(r"bytes=(\d+)-", self.headers.get("Range") or "")
+            if m and self.headers.get("If-Range", etag) == etag:
+                start = int(m.group(1))
+                if start >= len(body):
+                    self._reply(416, b"", "text/plain", extra={"Content-Range": f"bytes */{len(body)}"})
+                    return
+                extra["Content-Range"] = f"bytes {start}-{len(body) - 1}/{len(body)}"
+                body, status = body[start:], 206
+        elif method == "GET":
+            # Conditional requests: strong ETag over the body, 304 on a match
+            etag = '"%s"' % hashlib.sha1(body).hexdigest()[:16]
+            extra = {"ETag": etag}
+            if self.headers.get("If-None-Match") == etag:
+                self.server.count("not_modified")
+                self._reply(304, b"", ctype, extra=extra)
+                return
+        self.server.count(route, len(body))
+        self._reply(status, body, ctype, trickle=b.body_kbps, extra=extra)
+
+    def _route(self, method: str, path: str, qs: dict):
+        s = self.server
+        if path == "/fr/recherche-de-specialites":
+            page = int((qs.get("page") or ["1"])[0])
+            body = s.fr_search
+            if page > 1:
+                body = re.sub(rb"specid=(\d+)", lambda m: b"specid=%d" % (int(m.group(1)) + page * 100000000), body)
+            return "fr_search", body, "text/html; charset=utf-8"
+        if path == "/fr/extrait.php":
+            specid = (qs.get("specid") or ["0"])[0]
+            return "fr_detail", s.fr_detail.replace("60234100", specid).encode("utf-8"), "text/html; charset=utf-8"
+        if path == "/fr/affichageDoc.php":
+            return "fr_document", PDF_BODY, "application/pdf"
+        if path == "/pl/api/rpl/public/medicinal-products/search" and method == "POST":
+            return "pl_search", s.pl_search_page(qs), "application/json"
+        m = re.fullmatch(r"/pl/api/rpl/medicinal-products/(\d+)(/documents)?", path)
+        if m:
+            tmpl = s.pl_documents if m.group(2) else s.pl_product
+            route = "pl_documents" if m.group(2) else "pl_product"
+            return route, tmpl.replace("{product_id}", m.group(1)).encode("utf-8"), "application/json"
+        m = re.fullmatch(r"/de/(landing|search|results)\.html", path)
+        if m:
+            return f"de_{m.group(1)}", (FIXTURES / "de" / f"{m.group(1)}.html").read_bytes(), "text/html; charset=utf-8"
+        if path.startswith("/de/static/"):
+            return "de_static", b"/* static */", "text/css" if path.endswith(".css") else "application/javascript"
+        return "unknown", None, "text/plain"
+
+    def _reply(self, status: int, body: bytes, ctype: str, *, trickle: float = 0.0, extra: dict | None = None):
+        self.send_response(status)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (extra or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        if not trickle:
+            self.wfile.write(body)
+            return
+        chunk = 4096
+        delay = chunk / (trickle * 1024)
+        for i in range(0, len(body), chunk):
+            self.wfile.write(body[i:i + chunk])
+            self.wfile.flush()
+            time.sleep(delay)
+
+def point_adapters_at(base_url: str) -> None:
+    """Rewrite the adapters' registry URLs so they talk to the stand-in server."""
+    from medreg.adapters import de, fr, pl
+    fr.BASE = base_url + "fr/"
+    pl.SEARCH_URL = base_url + "pl/rpl/search/public"
+    pl.API_SEARCH_PREFIX = base_url + "pl/api/rpl/public/medicinal-products/search"
+    pl.API_PRODUCT = base_url + "pl/api/rpl/medicinal-products/{product_id}"
+    pl.API_DOCUMENTS = base_url + "pl/api/rpl/medicinal-products/{product_id}/documents"
+    de.LANDING_URL = base_url + "de/landing.html"
+    de.SEARCH_MODULE_URLS = [base_url + "de/search.html"]
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Serve recorded registry fixtures locally.")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8800)
+    ap.add_argument("--latency-ms", type=float, default=0.0)
+    ap.add_argument("--jitter-ms", type=float, default=0.0)
+    ap.add_argument("--rate", type=float, default=0.0, help="Allowed requests/second before 429s (0 = unlimited)")
+    ap.add_argument("--burst", type=int, default=10)
+    ap.add_argument("--body-kbps", type=float, default=0.0, help="Trickle response bodies at this KiB/s")
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    args = ap.parse_args()
+    behaviour = Behaviour(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, rate=args.rate, burst=args.burst,
+                          body_kbps=args.body_kbps, error_rate=args.error_rate)
+    server = StandinServer((args.host, args.port), behaviour)
+    print(f"stand-in registries on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Import-time regression check for the CLI's cheap paths.
+
+Runs `medreg --help`, usage errors and an unsupported country in fresh
+interpreters under `python -X importtime` and fails (exit 1) when one of them
+imports a heavy module (requests, bs4, lxml, the adapters, ...) or when the
+imports medreg triggers take longer than the budget:
+
+    python benchmarks/startup.py [--budget-ms 20] [--repeat 5] [--json]
+
+Timings are the best of --repeat runs; the module check is exact.
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+REPO = Path(__file__).resolve().parent.parent
+
+# argv for medreg.cli.main; each must return before any search starts
+CASES = {
+    "help": ["--help"],
+    "unsupported-country": ["-xx", "paracetamol"],
+    "missing-country": ["paracetamol"],
+    "missing-query": ["-fr"],
+}
+# Modules (and their submodules) that only a search may load
+FORBIDDEN = ("requests", "urllib3", "bs4", "lxml", "playwright", "charset_normalizer", "orjson", "sqlite3",
+             "http.client", "concurrent.futures", "medreg.adapters.base", "medreg.adapters.fr",
+             "medreg.adapters.pl", "medreg.adapters.de", "medreg.records", "medreg.serve")
+DEFAULT_BUDGET_MS = 20.0
+
+CHILD = "import sys; from medreg.cli import main; sys.exit(main(sys.argv[1:]))"
+
+def parse_importtime(stderr: str) -> tuple[float, list[str]]:
+    """
+    (milliseconds spent in imports started by medreg, modules imported) from
+    -X importtime output. Interpreter startup (site, encodings) is excluded:
+    counting starts at the first top-level medreg import.
+    """
+    total_us = 0
+    modules = []
+    block = []  # nested imports are listed before the top-level import that caused them
+    counting = False
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|", 2)
+        top_level = not name[1:].startswith(" ")
+        block.append(name.strip())
+        if not top_level:
+            continue
+        if block[-1].startswith("medreg"):
+            counting = True
+        if counting:
+            modules.extend(block)
+            total_us += int(cumulative)
+        block = []
+    return total_us / 1000, modules
+
+def run_case(argv: list[str]) -> tuple[float, list[str]]:
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [str(REPO), os.environ.get("PYTHONPATH")])))
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", CHILD, *argv], cwd=REPO, env=env,
+                          capture_output=True, text=True, timeout=60)
+    return parse_importtime(proc.stderr)
+
+def forbidden_in(modules: list[str]) -> list[str]:
+    return sorted({m for m in modules for bad in FORBIDDEN if m == bad or m.startswith(bad + ".")})
+
+def main(argv: list[str]) -> int:
+    p = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    p.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS,
+                   help=f"Max import time per case (default: {DEFAULT_BUDGET_MS:g} ms)")
+    p.add_argument("--repeat", type=int, default=5, help="Runs per case; the fastest counts (default: 5)")
+    p.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = p.parse_args(argv)
+
+    report = {}
+    failed = False
+    for name, case in CASES.items():
+        runs = [run_case(case) for _ in range(max(1, args.repeat))]
+        best_ms = min(ms for ms, _ in runs)
+        heavy = sorted({m for _, modules in runs for m in forbidden_in(modules)})
+        ok = not heavy and best_ms <= args.budget_ms
+        failed |= not ok
+        report[name] = {"argv": case, "import_ms": round(best_ms, 2), "modules": len(runs[0][1]),
+                        "forbidden": heavy, "ok": ok}
+
+    if args.json:
+        print(json.dumps({"budget_ms": args.budget_ms, "cases": report}, indent=2))
+    else:
+        print(f"medreg startup imports (budget {args.budget_ms:g} ms, best of {args.repeat})")
+        for name, r in report.items():
+            status = "ok  " if r["ok"] else "FAIL"
+            print(f"  {status} {name:<20} {r['import_ms']:7.2f} ms  {r['modules']:3d} modules  {' '.join(r['argv'])}")
+            if r["forbidden"]:
+                print(f"       imports: {', '.join(r['forbidden'])}")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
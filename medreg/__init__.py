@@ -1,2 +1,9 @@
-__all__ = ["__version__"]
-__version__ = "0.1.0"
\ No newline at end of file
+__all__ = ["__version__", "asearch", "aiter_search"]
+__version__ = "0.1.0"
+
+def __getattr__(name):
+    # The asyncio API is imported on first use so plain CLI runs do not pay for it
+    if name in ("asearch", "aiter_search"):
+        from . import aio
+        return getattr(aio, name)
+    raise AttributeError(f"module 'medreg' has no attribute {name!r}")
@@ -1,14 +1,42 @@
-from typing import Protocol, Optional
+from typing import Iterator, NamedTuple, Protocol, Optional
 
 class SearchError(Exception):
     pass
 
+class ResultEvent(NamedTuple):
+    # "result": a new result with its core fields, numbered 0, 1, 2, ... in order.
+    # "update": enrichment fields (spc_url, pil_url, mah, ...) for result `index`, or
+    #           {"incomplete": [field, ...]} for fields whose source did not answer in time.
+    kind: str
+    index: int
+    fields: dict
+
 class Adapter(Protocol):
-    def search(self, *, query: str, timeout: float, browser: bool, lang: Optional[str], limit: int) -> list[dict]:
+    # Fields that arrive in "update" events, after a result is listed
+    ENRICHED_FIELDS: tuple[str, ...]
+
+    # `timeout` bounds each request; `deadline` (seconds) bounds the whole search, which
+    # then returns what it has, marking fields it could not fetch as incomplete.
+    def search(self, *, query: str, timeout: float, browser: bool, lang: Optional[str], limit: int,
+               offline: bool = False, deadline: Optional[float] = None) -> list[dict]:
         ...
 
-def get_adapter(country: str):
+    def iter_search(self, *, query: str, timeout: float, browser: bool, lang: Optional[str], limit: int,
+                    offline: bool = False, deadline: Optional[float] = None) -> Iterator[ResultEvent]:
+        ...
+
+# Adapter modules are imported by get_adapter(), so checking a country code is cheap.
+COUNTRIES = ("fr", "de", "pl")
+
+def check_country(country: str) -> str:
+    """Lower-cased country code; raises SearchError for registries medreg does not support."""
     c = country.lower()
+    if c not in COUNTRIES:
+        raise SearchError(f"Unsupported country '{country}'. Supported: {', '.join(COUNTRIES)}")
+    return c
+
+def get_adapter(country: str):
+    c = check_country(country)
     if c == "fr":
         from . import fr as module
         return module
@@ -17,5 +45,4 @@ def get_adapter(country: str):
         return module
     if c == "pl":
         from . import pl as module
-        return module
-    raise SearchError(f"Unsupported country '{country}'. Supported: fr, de, pl")
\ No newline at end of file
+        return module
\ No newline at end of file
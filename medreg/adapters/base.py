@@ -1,14 +1,86 @@
 from __future__ import annotations
-from urllib.parse import urljoin
-from bs4 import BeautifulSoup
-from typing import Optional
-from ..utils.http import get_session
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from urllib.parse import urljoin, urlsplit
+from typing import TYPE_CHECKING, Callable, Iterable, Iterator, Optional, TypeVar
+from . import SearchError
+from ..utils import cache as http_cache
+from ..utils import latency
+from ..utils import trace
+from ..records import Result
+
+if TYPE_CHECKING:
+    from bs4 import BeautifulSoup
+
+# bs4, lxml and requests (via utils.http) are imported on first use, so importing
+# an adapter for argument checks or an offline search does not load them.
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# Defaults for fan-out of per-result requests (detail pages, documents, ...)
+MAX_WORKERS = 8
+PER_HOST_LIMIT = 4
+# Upper bound on result pages requested for one search, however large the limit
+MAX_PAGES = 20
+# Threads that carry hedged GETs (the original and its duplicate)
+HEDGE_WORKERS = 32
+
+_host_slots: dict[str, threading.BoundedSemaphore] = {}
+_host_slots_lock = threading.Lock()
+# Deadline of the iter_bounded() call running on this thread; requests made there
+# are cut off at it so a dropped call does not keep its host slot.
+_call = threading.local()
+_hedge_pool: Optional[ThreadPoolExecutor] = None
 
 def absolutize(base: str, href: str) -> str:
     return urljoin(base, href)
 
 def soupify(html: str) -> BeautifulSoup:
-    return BeautifulSoup(html, "lxml")
+    from bs4 import BeautifulSoup
+    with trace.span("parse.soup", bytes=len(html)):
+        return BeautifulSoup(html, "lxml")
+
+# Text of these elements is not part of what BeautifulSoup's get_text() returns
+_NON_TEXT_TAGS = frozenset({"script", "style", "template"})
+_FEED_CHUNK = 64 * 1024
+
+def iter_anchors(html: str) -> Iterator:
+    """
+    Stream <a href> elements of an HTML document with lxml's pull parser, without
+    building a BeautifulSoup tree. Callers can stop iterating early; only the part
+    of the document fed so far is parsed. Processed elements are freed as we go.
+    """
+    from lxml import etree
+    parser = etree.HTMLPullParser(events=("end",), tag="a")
+    for start in range(0, len(html), _FEED_CHUNK):
+        parser.feed(html[start:start + _FEED_CHUNK])
+        for _, el in parser.read_events():
+            if el.get("href") is not None:
+                yield el
+            el.clear(keep_tail=True)
+            # Everything before this anchor has been seen; drop it from the partial tree.
+            parent = el.getparent()
+            while parent is not None and el.getprevious() is not None:
+                del parent[0]
+    parser.close()
+    for _, el in parser.read_events():
+        if el.get("href") is not None:
+            yield el
+
+def _strings(el) -> Iterator[str]:
+    if el.text:
+        yield el.text
+    for child in el:
+        if isinstance(child.tag, str) and child.tag not in _NON_TEXT_TAGS:
+            yield from _strings(child)
+        if child.tail:
+            yield child.tail
+
+def node_text(el, separator: str = "") -> str:
+    """Equivalent of BeautifulSoup's el.get_text(separator, strip=True) for an lxml element."""
+    return separator.join(t for t in (s.strip() for s in _strings(el)) if t)
 
 def default_headers() -> dict[str, str]:
     return {
@@ -17,11 +89,288 @@ def default_headers() -> dict[str, str]:
         "Accept-Language": "en-US,en;q=0.9",
     }
 
-def simple_get(url: str, *, timeout: float, headers: Optional[dict] = None, params: Optional[dict] = None):
+def simple_get(url: str, *, timeout: float, headers: Optional[dict] = None, params: Optional[dict] = None,
+               ttl: Optional[float] = None):
+    """
+    GET with the shared session. When `ttl` is given and the on-disk cache is
+    enabled, fresh entries are served without a request and stale ones are
+    revalidated with ETag/Last-Modified. `timeout` is a ceiling: endpoints with
+    enough recorded latency get a tighter one (utils.latency), and with hedging
+    on, a request slower than the endpoint's p95 is sent a second time.
+    """
+    from ..utils.http import get_session
+    sess = get_session()
+    hdrs = default_headers()
+    if headers:
+        hdrs.update(headers)
+
+    with trace.span("http.get", url=url) as sp:
+        cache = http_cache.get_cache() if ttl is not None else None
+        entry = None
+        if cache is not None:
+            key = http_cache.cache_key("GET", url, params)
+            entry = cache.get(key)
+            if entry is not None:
+                if ttl > 0 and entry.is_fresh(ttl) and not http_cache.refresh_requested():
+                    resp = entry.to_response()
+                    sp.set(cache="hit", status=resp.status_code, bytes=len(resp.content))
+                    return resp
+                hdrs.update(entry.validators())
+
+        timeout, capped = _call_timeout(timeout)
+        delay = latency.hedge_delay(url)
+        if capped:  # the deadline comes first; neither adapt nor hedge
+            resp = _timed_get(sess, url, headers=hdrs, timeout=timeout, params=params, capped=True)
+        elif delay is None:
+            resp = _timed_get(sess, url, headers=hdrs, timeout=timeout, params=params)
+        else:
+            resp = _hedged_get(sp, delay, sess, url, headers=hdrs, timeout=timeout, params=params)
+        _record_http(sp, resp, "off" if cache is None else "miss")
+        if entry is not None and resp.status_code == 304:
+            cache.revalidated(entry.key)
+            sp.set(cache="revalidated")
+            return entry.to_response()
+        resp.raise_for_status()
+        if cache is not None and resp.status_code == 200:
+            cache.put(key, resp)
+        return resp
+
+def simple_post(url: str, *, timeout: float, json: Optional[dict] = None, headers: Optional[dict] = None,
+                params: Optional[dict] = None, ttl: Optional[float] = None):
+    """
+    POST a JSON body. With `ttl` the response is cached like simple_get's, keyed
+    on the URL and the body, which suits read-only search endpoints.
+    """
+    from ..utils.http import get_session
     sess = get_session()
     hdrs = default_headers()
+    hdrs["Accept"] = "application/json, text/plain, */*"
     if headers:
         hdrs.update(headers)
-    resp = sess.get(url, headers=hdrs, timeout=timeout, params=params, allow_redirects=True)
-    resp.raise_for_status()
-    return resp
\ No newline at end of file
+    with trace.span("http.post", url=url) as sp:
+        cache = http_cache.get_cache() if ttl is not None else None
+        entry = None
+        if cache is not None:
+            from json import dumps as json_dumps
+            body = json_dumps(json, sort_keys=True, separators=(",", ":")).encode("utf-8")
+            key = http_cache.cache_key("POST", url, params, body=body)
+            entry = cache.get(key)
+            if entry is not None:
+                if ttl > 0 and entry.is_fresh(ttl) and not http_cache.refresh_requested():
+                    resp = entry.to_response()
+                    sp.set(cache="hit", status=resp.status_code, bytes=len(resp.content))
+                    return resp
+                hdrs.update(entry.validators())
+
+        timeout, capped = _call_timeout(timeout)
+        timeout = latency.timeout_for(url, timeout)
+        try:
+            resp = sess.post(url, headers=hdrs, timeout=timeout, params=params, json=json, allow_redirects=True)
+        except Exception as e:
+            if _timed_out(e) and not capped:
+                latency.record(url, timeout)
+            raise
+        latency.record(url, resp.elapsed.total_seconds())
+        _record_http(sp, resp, "off" if cache is None else "miss")
+        if entry is not None and resp.status_code == 304:
+            cache.revalidated(entry.key)
+            sp.set(cache="revalidated")
+            return entry.to_response()
+        resp.raise_for_status()
+        if cache is not None and resp.status_code == 200:
+            cache.put(key, resp)
+        return resp
+
+def _timed_out(exc: Exception) -> bool:
+    # requests raises Timeout, or ConnectionError wrapping a read timeout once retries ran out
+    import requests
+    from urllib3.exceptions import ReadTimeoutError
+    return isinstance(exc, requests.Timeout) or isinstance(getattr(exc.args[0] if exc.args else None, "reason", None),
+                                                             ReadTimeoutError)
+
+def _call_timeout(timeout: float) -> tuple[float, bool]:
+    """(timeout, whether it was shortened) within the current iter_bounded() call's deadline."""
+    end = getattr(_call, "deadline", None)
+    if end is None:
+        return timeout, False
+    left = end - time.monotonic()
+    if left <= 0:
+        raise TimeoutError("deadline exceeded before request started")
+    return min(timeout, left), left < timeout
+
+def _timed_get(sess, url: str, *, timeout: float, capped: bool = False, **kwargs):
+    """
+    One GET with the endpoint's adaptive timeout; its latency is recorded. A
+    timeout `capped` by a deadline says nothing about the endpoint and is not.
+    """
+    if not capped:
+        timeout = latency.timeout_for(url, timeout)
+    try:
+        resp = sess.get(url, timeout=timeout, allow_redirects=True, **kwargs)
+    except Exception as e:
+        if _timed_out(e) and not capped:
+            latency.record(url, timeout)
+        raise
+    latency.record(url, resp.elapsed.total_seconds())
+    return resp
+
+def _hedged_get(sp, delay: float, sess, url: str, **kwargs):
+    """
+    _timed_get, plus a duplicate request if no answer came within `delay`
+    seconds; the first successful response wins. The loser is left to finish in
+    the background so its connection goes back to the pool.
+    """
+    global _hedge_pool
+    with _host_slots_lock:
+        if _hedge_pool is None:
+            _hedge_pool = ThreadPoolExecutor(max_workers=HEDGE_WORKERS, thread_name_prefix="medreg-hedge")
+    first = _hedge_pool.submit(_timed_get, sess, url, **kwargs)
+    done, _ = wait([first], timeout=delay)
+    if done:
+        return first.result()
+    backup = _hedge_pool.submit(_timed_get, sess, url, **kwargs)
+    sp.set(hedged=True)
+    pending = {first, backup}
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for fut in done:
+            if fut.exception() is None:
+                sp.set(hedge_won=fut is backup)
+                return fut.result()
+    return first.result()
+
+def _record_http(sp, resp, cache: str) -> None:
+    if not trace.enabled():
+        return
+    # requests reads the body before returning; `elapsed` stops once headers are parsed,
+    # so it covers connect/TLS (new connections only) plus time to first byte.
+    ttfb = resp.elapsed.total_seconds() * 1000
+    total = (time.perf_counter() - sp.start) * 1000
+    sp.set(cache=cache, status=resp.status_code, bytes=len(resp.content),
+           ttfb_ms=round(ttfb, 3), body_ms=round(max(0.0, total - ttfb), 3))
+
+def search_end(deadline: Optional[float]) -> Optional[float]:
+    """time.monotonic() value by which a search given `deadline` seconds must return (None: no deadline)."""
+    return None if deadline is None else time.monotonic() + deadline
+
+def time_left(end: Optional[float], timeout: float, registry: str) -> float:
+    """Per-request timeout within a search deadline (see search_end)."""
+    if end is None:
+        return timeout
+    left = end - time.monotonic()
+    if left <= 0:
+        raise SearchError(f"{registry}: search deadline exceeded before any results")
+    return min(timeout, left)
+
+def deadline_passed(end: Optional[float]) -> bool:
+    return end is not None and time.monotonic() >= end
+
+def earliest(*ends: Optional[float]) -> Optional[float]:
+    return min((e for e in ends if e is not None), default=None)
+
+def _host_slot(url: str, per_host: int) -> threading.BoundedSemaphore:
+    host = urlsplit(url).netloc.lower()
+    key = f"{host}#{per_host}"
+    with _host_slots_lock:
+        sem = _host_slots.get(key)
+        if sem is None:
+            sem = threading.BoundedSemaphore(per_host)
+            _host_slots[key] = sem
+        return sem
+
+def iter_bounded(
+    func: Callable[[T], R],
+    items: Iterable[T],
+    *,
+    url_of: Callable[[T], Optional[str]],
+    deadline: Optional[float] = None,
+    max_workers: int = MAX_WORKERS,
+    per_host: int = PER_HOST_LIMIT,
+) -> Iterator[tuple[int, R]]:
+    """
+    Run func over items on a bounded thread pool, at most `per_host` calls
+    in flight per host, yielding (index, result) as calls complete. Calls
+    that raise or do not finish before `deadline` (a time.monotonic() value)
+    are skipped. Closing the generator early abandons outstanding calls.
+    With a deadline, waiting for a host slot and the requests func makes
+    (simple_get/simple_post) end at it, so abandoned calls free their slots.
+    """
+    items = list(items)
+    if not items:
+        return
+
+    def run(item: T) -> R:
+        _call.deadline = deadline
+        try:
+            url = url_of(item)
+            if not url:
+                return func(item)
+            slot = _host_slot(url, per_host)
+            left = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if not slot.acquire(timeout=left):
+                raise TimeoutError("deadline exceeded before request started")
+            try:
+                return func(item)
+            finally:
+                slot.release()
+        finally:
+            _call.deadline = None
+
+    pool = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(items))), thread_name_prefix="medreg")
+    try:
+        pending = {pool.submit(run, item): i for i, item in enumerate(items)}
+        while pending:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                break
+            done, _ = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for fut in done:
+                i = pending.pop(fut)
+                try:
+                    result = fut.result()
+                except Exception:
+                    continue
+                yield i, result
+    finally:
+        # Do not block on stragglers; they finish (or time out) in the background.
+        pool.shutdown(wait=False, cancel_futures=True)
+
+def iter_ordered(
+    func: Callable[[T], R],
+    items: Iterable[T],
+    *,
+    url_of: Callable[[T], Optional[str]],
+    deadline: Optional[float] = None,
+    max_workers: int = MAX_WORKERS,
+    per_host: int = PER_HOST_LIMIT,
+) -> Iterator[Optional[R]]:
+    """
+    Like iter_bounded, but results come back in input order, each as soon as it
+    and everything before it has finished; an item whose call raised or did not
+    finish before `deadline` yields None. Used for result pages, which must be
+    merged in order but can be fetched concurrently.
+    """
+    items = list(items)
+    calls = iter_bounded(func, items, url_of=url_of, deadline=deadline, max_workers=max_workers, per_host=per_host)
+    finished: dict[int, R] = {}
+    n = 0
+    try:
+        for i, result in calls:
+            finished[i] = result
+            while n in finished:
+                yield finished.pop(n)
+                n += 1
+        for n in range(n, len(items)):
+            yield finished.pop(n, None)
+    finally:
+        calls.close()
+
+def collect(events: Iterable) -> list[Result]:
+    """Fold a stream of ResultEvents (see adapters.Adapter.iter_search) into the final result list."""
+    results: list[Result] = []
+    for ev in events:
+        if ev.kind == "result":
+            results.append(Result.from_mapping(ev.fields))
+        else:
+            results[ev.index].update(ev.fields)
+    return results
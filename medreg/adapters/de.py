@@ -1,111 +1,140 @@
 from __future__ import annotations
-from typing import Optional, List, Dict
+from typing import Iterator, Optional, List
 from urllib.parse import urljoin
 
 from . import base
-from .__init__ import SearchError
+from . import ResultEvent, SearchError
+from ..records import Result
+from ..utils import trace
+from ..utils.browser import open_page, click_first, extract_links, settle, url_pattern
+from ..utils.selectors import ABSENT, SelectorMemory, site_version
 
 # Germany uses PharmNet.Bund / AMIce public modules.
 # The UI and endpoints can be dynamic; requests-only is often unreliable.
 # We provide a headless-browser flow; for requests-only we return a clear guidance.
 
 PHARMNET_ROOT = "https://www.pharmnet-bund.de/"
+LANDING_URL = "https://www.pharmnet-bund.de/PharmNet/DE/Oeffentlichkeit/Arzneimittel-Informationssystem/_node.html"
+# Likely locations of the Arzneimittel search module, tried in order
+SEARCH_MODULE_URLS = [
+    "https://www.bfarm.de/DE/Arzneimittel/Arzneimittelinformationen/Arzneimittel-recherchieren/AMIce/_node.html",
+]
+# Results are complete when scraped; iter_search sends no update events
+ENRICHED_FIELDS = ()
+MISSING_PLAYWRIGHT = "DE: --browser requested but Playwright is not installed. Install with: pip install 'medreg[browser]' && playwright install"
 
-def _search_with_browser(query: str, timeout: float, limit: int) -> List[Dict]:
+def _search_with_browser(query: str, timeout: float, limit: int, end: Optional[float] = None) -> List[Result]:
     # Requires extra 'browser' dependency and 'playwright install'
-    try:
-        from playwright.sync_api import sync_playwright
-    except ImportError:
-        raise SearchError("DE: --browser requested but Playwright is not installed. Install with: pip install 'medreg[browser]' && playwright install")
+    results: List[Result] = []
 
-    results: List[Dict] = []
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        try:
-            page = browser.new_page()
-            # Go to PharmNet public info system landing
-            page.goto("https://www.pharmnet-bund.de/PharmNet/DE/Oeffentlichkeit/Arzneimittel-Informationssystem/_node.html", timeout=int(timeout * 1000))
-            # Try to find a link to the public AMIce search (Arzneimittel)
-            # Click the first link containing "Arzneimittel-Informationssystem" or "AMIce"
-            # Then attempt to find a search field on the resulting page.
-            # Note: This is heuristic; adjust selectors if the site updates.
-            # Try common paths first:
-            # Some pages embed an <iframe> for the search; we navigate to likely search module directly if present.
-            # As a fallback, navigate to the AMIce module description and follow "zum Suchformular".
+    def budget(seconds: float) -> float:
+        # Each step gets at most what is left before `end` (SearchError once it has passed)
+        return base.time_left(end, seconds, "DE")
+
+    with open_page(missing_message=MISSING_PLAYWRIGHT) as page:
+        # Go to PharmNet public info system landing
+        with trace.span("browser.goto", url=LANDING_URL):
+            page.goto(LANDING_URL, timeout=int(budget(timeout) * 1000))
+        # Try to find a link to the public AMIce search (Arzneimittel)
+        # Click the first link containing "Arzneimittel-Informationssystem" or "AMIce"
+        # Then attempt to find a search field on the resulting page.
+        # Note: This is heuristic; adjust selectors if the site updates.
+        # Try common paths first:
+        # Some pages embed an <iframe> for the search; we navigate to likely search module directly if present.
+        # As a fallback, navigate to the AMIce module description and follow "zum Suchformular".
+        # Known-good selectors and frames from earlier runs against this site version
+        memory = SelectorMemory("de", site_version(page))
+        # Jump to AMIce module page if present
+        click_first(page, ["a:has-text('AMIce')"], timeout=budget(3.0), memory=memory, slot="amice_link")
+
+        # Heuristic: visit the Arzneimittel search module if known path exists
+        for url in SEARCH_MODULE_URLS:
             try:
-                # Jump to AMIce module page if present
-                page.click("a:has-text('AMIce')", timeout=3000)
+                with trace.span("browser.goto", url=url):
+                    page.goto(url, timeout=int(budget(timeout) * 1000))
+                break
             except Exception:
-                pass
+                continue
 
-            # Heuristic: visit the Arzneimittel search module if known path exists
-            # We try a set of likely URLs
-            candidates = [
-                "https://www.bfarm.de/DE/Arzneimittel/Arzneimittelinformationen/Arzneimittel-recherchieren/AMIce/_node.html",
-            ]
-            for url in candidates:
-                try:
-                    page.goto(url, timeout=int(timeout * 1000))
-                    break
-                except Exception:
-                    continue
+        # Find any input on the page and try searching with ENTER
+        # Then collect links that look like product result entries (this may render in an iframe).
+        # If iframe exists, switch into it and try again.
+        def try_in_context(c):
+            try:
+                c.fill("input[type='text']", query, timeout=int(budget(2.0) * 1000))
+            except Exception:
+                inputs = c.query_selector_all("input")
+                if inputs:
+                    inputs[0].fill(query, timeout=int(budget(2.0) * 1000))
+            try:
+                c.press("input[type='text']", "Enter", timeout=int(budget(2.0) * 1000))
+            except Exception:
+                # Try clicking a button with label 'Suchen' or 'Search'
+                click_first(c, ["button:has-text('Suchen')", "input[type='submit']", "button"], timeout=budget(1.0),
+                            memory=memory, slot="submit_button")
 
-            # Find any input on the page and try searching with ENTER
-            # Then collect links that look like product result entries (this may render in an iframe).
-            # If iframe exists, switch into it and try again.
-            def try_in_context(c):
-                try:
-                    c.fill("input[type='text']", query, timeout=2000)
-                except Exception:
-                    inputs = c.query_selector_all("input")
-                    if inputs:
-                        inputs[0].fill(query)
-                try:
-                    c.press("input[type='text']", "Enter", timeout=2000)
-                except Exception:
-                    # Try clicking a button with label 'Suchen' or 'Search'
-                    for sel in ["button:has-text('Suchen')", "input[type='submit']", "button"]:
-                        try:
-                            c.click(sel, timeout=1000)
-                            break
-                        except Exception:
-                            continue
+            # Wait for the result request to finish instead of sleeping a fixed time
+            settle(c, timeout=budget(min(timeout, 5.0)))
+            items = []
+            for link in extract_links(c, 400):
+                href = link["href"]
+                text = link["text"]
+                if not text or not href:
+                    continue
+                # Heuristic: exclude navigation; keep records that look like drug entries
+                if "Arzneimittel" in text or "Fachinformation" in text or len(text) > 8:
+                    items.append(Result(product_name=text, detail_url=c.url if href.startswith("#") else (href if href.startswith("http") else urljoin(c.url, href))))
+                if len(items) >= limit:
+                    break
+            return items
 
-                c.wait_for_timeout(1500)
-                anchors = c.query_selector_all("a")
-                items = []
-                for a in anchors[:400]:
-                    href = a.get_attribute("href") or ""
-                    text = (a.inner_text() or "").strip()
-                    if not text or not href:
-                        continue
-                    # Heuristic: exclude navigation; keep records that look like drug entries
-                    if "Arzneimittel" in text or "Fachinformation" in text or len(text) > 8:
-                        items.append({"product_name": text, "detail_url": c.url if href.startswith("#") else (href if href.startswith("http") else urljoin(c.url, href))})
-                    if len(items) >= limit:
-                        break
-                return items
+        def frames():
+            # Read lazily: searching the main page can create or navigate iframes
+            known_frame = memory.get("results_frame")
+            if known_frame and known_frame != ABSENT:
+                yield from (f for f in page.frames if f != page.main_frame and url_pattern(f.url) == known_frame)
+            yield page.main_frame
+            yield from (f for f in page.frames if f != page.main_frame)
 
-            # Try main context
-            items = try_in_context(page)
-            # Try inside iframes if needed
-            if not items:
-                for frame in page.frames:
-                    if frame == page.main_frame:
-                        continue
-                    try:
-                        items = try_in_context(frame)
-                        if items:
-                            break
-                    except Exception:
-                        continue
+        # Try the frame that produced results last time first, then the main page, then iframes
+        items = []
+        tried = []
+        for ctx in frames():
+            if base.deadline_passed(end):
+                break
+            if ctx in tried or ctx.is_detached():
+                continue
+            tried.append(ctx)
+            try:
+                items = try_in_context(ctx)
+            except Exception:
+                if ctx == page.main_frame:
+                    raise
+                continue
+            if items:
+                memory.remember("results_frame", ABSENT if ctx == page.main_frame else url_pattern(ctx.url))
+                memory.save()
+                break
+        if not items and base.deadline_passed(end):
+            raise SearchError("DE: search deadline exceeded before any results")
 
-            results = items[:limit]
-        finally:
-            browser.close()
+        results = items[:limit]
     return results
 
-def search(*, query: str, timeout: float, browser: bool, lang: Optional[str], limit: int) -> list[dict]:
+def search(*, query: str, timeout: float, browser: bool, lang: Optional[str], limit: int,
+           offline: bool = False, deadline: Optional[float] = None) -> list[Result]:
+    if offline:
+        raise SearchError("DE: no offline mirror is available for this registry.")
     if not browser:
         raise SearchError("DE: This registry often requires JavaScript/interactive search. Re-run with --browser (and install Playwright).")
-    return _search_with_browser(query, timeout=timeout, limit=limit)
\ No newline at end of file
+    # The browser flow is one sequence of page waits; each gets what is left of the deadline,
+    # and the frames not searched by then are skipped.
+    return _search_with_browser(query, timeout=timeout, limit=limit, end=base.search_end(deadline))
+
+def iter_search(*, query: str, timeout: float, browser: bool, lang: Optional[str], limit: int,
+                offline: bool = False, deadline: Optional[float] = None) -> Iterator[ResultEvent]:
+    # Results are scraped from the rendered page in one go; there is nothing to enrich later.
+    results = search(query=query, timeout=timeout, browser=browser, lang=lang, limit=limit, offline=offline,
+                     deadline=deadline)
+    for i, r in enumerate(results):
+        yield ResultEvent("result", i, r)
\ No newline at end of file
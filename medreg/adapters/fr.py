@@ -1,49 +1,70 @@
 from __future__ import annotations
-from typing import Optional, List, Dict
+from typing import Iterator, Optional, List, Dict
 import re
+import time
 from urllib.parse import urljoin
 
 from . import base
-from .__init__ import SearchError
+from . import ResultEvent, SearchError
+from ..records import Result
+from ..utils import trace
 
 BASE = "https://base-donnees-publique.medicaments.gouv.fr/"
 
-def _extract_results_from_search(html: str, limit: int) -> List[Dict]:
-    soup = base.soupify(html)
-    results: List[Dict] = []
+# On-disk cache TTLs (seconds), used when the HTTP cache is enabled
+SEARCH_CACHE_TTL = 6 * 3600
+DETAIL_CACHE_TTL = 7 * 24 * 3600
+# Fields that come from the detail page
+DETAIL_FIELDS = ("spc_url", "pil_url")
+# Fields iter_search adds after the listing (update events)
+ENRICHED_FIELDS = DETAIL_FIELDS
+
+# Links of the search page's pagination bar
+_PAGE_LINK = re.compile(r"recherche-de-specialites\?(?:.*&)?page=(\d+)")
+
+def _extract_results_from_search(html: str, limit: int) -> List[Result]:
+    return _parse_search_page(html, limit)[0]
+
+def _parse_search_page(html: str, limit: int, seen: Optional[set] = None) -> tuple[List[Result], int]:
+    """
+    Results of one search page (at most `limit`, skipping detail URLs already in
+    `seen`) and the highest page number its pagination bar links to (0 if none).
+    """
+    results: List[Result] = []
+    seen = set() if seen is None else seen
+    last_page = 0
     # The FR BDPM search typically lists "spécialités" with links to detail pages.
-    # Heuristic: search for anchors whose href contains 'affichageDoc.php' or '/extrait.php'
-    for a in soup.find_all("a", href=True):
-        href = a["href"]
-        text = a.get_text(strip=True)
-        if not text:
+    # Heuristic: search for anchors whose href contains 'affichageDoc.php' or '/extrait.php'.
+    # Anchors are streamed and de-duplicated by URL as we go, so parsing stops at `limit`.
+    for a in base.iter_anchors(html):
+        href = a.get("href")
+        m = _PAGE_LINK.search(href)
+        if m:
+            last_page = max(last_page, int(m.group(1)))
+            continue
+        if not ("affichageDoc.php" in href or "extrait.php" in href or "fiche" in href):
             continue
-        if "affichageDoc.php" in href or "extrait.php" in href or "fiche" in href:
-            url = urljoin(BASE, href)
-            # Filter obvious navigation links
-            if "telechargement" in href.lower():
-                continue
-            if text and len(text) >= 3:
-                results.append({"product_name": text, "detail_url": url})
+        # Filter obvious navigation links
+        if "telechargement" in href.lower():
+            continue
+        text = base.node_text(a)
+        if len(text) < 3:
+            continue
+        url = urljoin(BASE, href)
+        if url in seen:
+            continue
+        seen.add(url)
+        results.append(Result(product_name=text, detail_url=url))
         if len(results) >= limit:
             break
-    # De-duplicate by URL
-    seen = set()
-    uniq = []
-    for r in results:
-        u = r["detail_url"]
-        if u not in seen:
-            uniq.append(r)
-            seen.add(u)
-    return uniq[:limit]
+    return results, last_page
 
 def _maybe_extract_docs(detail_html: str) -> Dict[str, str]:
-    soup = base.soupify(detail_html)
     out: Dict[str, str] = {}
     # On FR BDPM, RCP (SmPC) links often reference PDF or have label 'RCP' or 'Résumé des caractéristiques du produit'.
-    for a in soup.find_all("a", href=True):
-        label = a.get_text(" ", strip=True)
-        href = a["href"]
+    for a in base.iter_anchors(detail_html):
+        label = base.node_text(a, " ")
+        href = a.get("href")
         low = label.lower()
         if "rcp" in low or "caractéristiques du produit" in low or "résumé" in low:
             out["spc_url"] = urljoin(BASE, href)
@@ -51,33 +72,114 @@ def _maybe_extract_docs(detail_html: str) -> Dict[str, str]:
             out["pil_url"] = urljoin(BASE, href)
     return out
 
-def search(*, query: str, timeout: float, browser: bool, lang: Optional[str], limit: int) -> list[dict]:
+def _search_page(query: str, page: int, timeout: float) -> str:
     # FR search endpoint (server-rendered) - try broad query field by characters
     # Known pattern: 'recherche-de-specialites?txtCaracteres=<q>'
     params = {
         "txtCaracteres": query,
-        "page": "1",
+        "page": str(page),
         "affNomSubstances": "1",   # include substance names
         "affListe": "0",
         "isDisponibilite": "0",
     }
+    resp = base.simple_get(urljoin(BASE, "recherche-de-specialites"), timeout=timeout, params=params, ttl=SEARCH_CACHE_TTL)
+    return resp.text
+
+def _iter_listed(*, query: str, timeout: float, limit: int,
+                 end: Optional[float] = None) -> Iterator[tuple[Result, list[str]]]:
+    """
+    list_results, one page at a time. Pages after the first are requested together,
+    as many as should cover the rest of `limit` at the first page's size; the
+    pagination bar of each parsed page says how far the listing goes. Paging stops
+    at `end` (see base.search_end); a page that fails before then raises SearchError,
+    so a partial listing is never passed off as the whole one.
+    """
+    first_timeout = base.time_left(end, timeout, "FR")
     try:
-        resp = base.simple_get(urljoin(BASE, "recherche-de-specialites"), timeout=timeout, params=params)
+        html = _search_page(query, 1, first_timeout)
     except Exception as e:
+        base.time_left(end, timeout, "FR")  # a timeout cut short by the deadline is not a failure
         raise SearchError(f"FR: search request failed: {e}")
+    seen: set = set()
+    with trace.span("parse.fr_search", bytes=len(html), page=1):
+        results, last_page = _parse_search_page(html, limit, seen)
+    yield from ((r, [r["detail_url"]]) for r in results)
+    count = len(results)
+    per_page = max(count, 1)
+    page = 2
+    while count < limit and page <= min(last_page, base.MAX_PAGES) and (end is None or time.monotonic() < end):
+        batch = range(page, min(last_page, base.MAX_PAGES, page + -(-(limit - count) // per_page) - 1) + 1)
+        pages = base.iter_ordered(lambda p: _search_page(query, p, timeout), batch, url_of=lambda p: BASE, deadline=end)
+        try:
+            for p, html in zip(batch, pages):
+                if html is None:
+                    if base.deadline_passed(end):
+                        return
+                    raise SearchError(f"FR: result page {p} failed")
+                with trace.span("parse.fr_search", bytes=len(html), page=p):
+                    results, last = _parse_search_page(html, limit - count, seen)
+                last_page = max(last_page, last)
+                yield from ((r, [r["detail_url"]]) for r in results)
+                count += len(results)
+                if count >= limit:
+                    break
+        finally:
+            pages.close()
+        page = batch.stop
+
+def list_results(*, query: str, timeout: float, limit: int, browser: bool = False) -> list[tuple[Result, list[str]]]:
+    """
+    Search results with their core fields, each paired with the URLs its enrichment
+    comes from (the detail page). Pages through the listing until `limit` unique
+    results are found. Used by iter_search and `medreg sync`.
+    """
+    return list(_iter_listed(query=query, timeout=timeout, limit=limit))
+
+def apply_source(result: Dict, url: str, resp) -> None:
+    """Add the fields found in a source response (see list_results) to result."""
+    html = resp.text
+    with trace.span("parse.fr_detail", bytes=len(html)):
+        result.update(_maybe_extract_docs(html))
+
+def iter_search(*, query: str, timeout: float, browser: bool, lang: Optional[str], limit: int,
+                offline: bool = False, deadline: Optional[float] = None) -> Iterator[ResultEvent]:
+    if offline:
+        # Answer from the local BDPM mirror built by 'medreg mirror fr'; no network access.
+        from ..mirror import load_fr
+        for i, r in enumerate(load_fr().search(query, limit=limit)):
+            yield ResultEvent("result", i, r)
+        return
+
+    # Names and detail URLs are known after one round trip; hand them out right away,
+    # page by page.
+    end = base.search_end(deadline)
+    results = []
+    for i, (r, _) in enumerate(_iter_listed(query=query, timeout=timeout, limit=limit, end=end)):
+        results.append(r)
+        yield ResultEvent("result", i, r)
+
+    # Enrich each result with RCP/PIL links by visiting the detail page (best-effort).
+    # Detail pages are fetched concurrently; the whole stage shares one deadline so a
+    # single slow page cannot hold up the response. Results whose page missed it (or
+    # failed) keep detail_url and list the detail page's fields as incomplete.
+    stage_end = base.earliest(time.monotonic() + timeout, end)
+
+    def fetch_docs(r: Result) -> Dict[str, str]:
+        docs: Dict[str, str] = {}
+        apply_source(docs, r["detail_url"], base.simple_get(r["detail_url"], timeout=timeout, ttl=DETAIL_CACHE_TTL))
+        return docs
+
+    answered = set()
+    for i, docs in base.iter_bounded(fetch_docs, results, url_of=lambda r: r.get("detail_url"), deadline=stage_end):
+        answered.add(i)
+        if docs:
+            yield ResultEvent("update", i, docs)
+    for i, r in enumerate(results):
+        missing = [f for f in DETAIL_FIELDS if i not in answered and not r.get(f)]
+        if missing:
+            yield ResultEvent("update", i, {"incomplete": missing})
 
-    results = _extract_results_from_search(resp.text, limit=limit)
-    # Optionally enrich each result with RCP/PIL links by visiting the detail page (best-effort)
-    enriched = []
-    for r in results:
-        out = dict(r)
-        detail_url = r.get("detail_url")
-        if detail_url:
-            try:
-                det = base.simple_get(detail_url, timeout=timeout)
-                docs = _maybe_extract_docs(det.text)
-                out.update(docs)
-            except Exception:
-                pass
-        enriched.append(out)
-    return enriched
\ No newline at end of file
+def search(*, query: str, timeout: float, browser: bool, lang: Optional[str], limit: int,
+           offline: bool = False, deadline: Optional[float] = None) -> list[Result]:
+    return base.collect(iter_search(query=query, timeout=timeout, browser=browser, lang=lang, limit=limit,
+                                    offline=offline, deadline=deadline))
@@ -1,184 +1,332 @@
 from __future__ import annotations
 
-from typing import Optional, List, Dict
+import itertools
+import time
+from typing import Iterator, MutableMapping, Optional, List, Dict
 from urllib.parse import urljoin
 
 from . import base
-from .__init__ import SearchError
+from . import ResultEvent, SearchError
+from ..records import Result
+from ..utils import trace
+from ..utils.browser import open_page, click_first, first_match, url_pattern, wait_for_frame
+from ..utils.selectors import ABSENT, SelectorMemory, site_version
 
 SEARCH_URL = "https://rejestry.ezdrowie.gov.pl/rpl/search/public"
 API_SEARCH_PREFIX = "https://rejestry.ezdrowie.gov.pl/api/rpl/public/medicinal-products/search"
 API_PRODUCT = "https://rejestry.ezdrowie.gov.pl/api/rpl/medicinal-products/{product_id}"
 API_DOCUMENTS = "https://rejestry.ezdrowie.gov.pl/api/rpl/medicinal-products/{product_id}/documents"
 
+MISSING_PLAYWRIGHT = (
+    "PL: browser automation requested but Playwright is not installed. "
+    "Install medreg[browser] and run 'playwright install chromium'."
+)
 
-def _search_with_browser(query: str, timeout: float, limit: int) -> List[Dict]:
+# On-disk cache TTLs (seconds), used when the HTTP cache is enabled
+SEARCH_CACHE_TTL = 6 * 3600
+API_CACHE_TTL = 24 * 3600  # product/document API responses
+# Fields iter_search adds after the listing (update events)
+ENRICHED_FIELDS = ("mah", "spc_url", "pil_url")
+# Largest page requested from the search API; bigger limits are fetched as several pages
+API_PAGE_SIZE = 100
+
+
+class _ApiRejected(Exception):
+    pass
+
+
+def _search_api(query: str, timeout: float, limit: int, page: int = 0) -> dict:
+    """
+    Call the public search endpoint the RPL web app uses, without a browser.
+    Raises _ApiRejected when the registry refuses the request (a 4xx answer) or
+    answers with something that is not a search result document; timeouts,
+    connection errors and 5xx answers are raised as SearchError.
+    """
+    params = {"page": str(page), "size": str(min(max(limit, 10), API_PAGE_SIZE)), "sort": "name,ASC"}
+    body = {"name": query, "isAdvancedSearch": False}
+    headers = {"Origin": "https://rejestry.ezdrowie.gov.pl", "Referer": SEARCH_URL}
     try:
-        from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeout
-    except ImportError:
-        raise SearchError(
-            "PL: browser automation requested but Playwright is not installed. "
-            "Install medreg[browser] and run 'playwright install chromium'."
-        )
+        resp = base.simple_post(API_SEARCH_PREFIX, timeout=timeout, json=body, params=params, headers=headers,
+                                ttl=SEARCH_CACHE_TTL)
+    except Exception as e:
+        status = getattr(getattr(e, "response", None), "status_code", None)
+        # 408/429 are the server being slow or busy, not refusing this client
+        if status is not None and 400 <= status < 500 and status not in (408, 429):
+            raise _ApiRejected(str(e))
+        raise SearchError(f"PL: search request failed: {e}")
+    try:
+        data = resp.json()
+    except ValueError:
+        raise _ApiRejected("search response is not JSON")
+    if not isinstance(data, dict) or not any(k in data for k in ("content", "items")):
+        raise _ApiRejected("unexpected search response shape")
+    return data
 
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        try:
-            page = browser.new_page()
-            page.goto(SEARCH_URL, timeout=int(timeout * 1000))
-            page.wait_for_load_state("domcontentloaded")
-
-            # Accept cookie banners if present
-            for selector in [
-                "button:has-text('Akceptuj')",
-                "button:has-text('Zaakceptuj')",
-                "button:has-text('Accept')",
-                "button:has-text('Zgadzam się')",
-            ]:
-                try:
-                    page.click(selector, timeout=1500)
-                except Exception:
-                    pass
-
-            # Find the iframe that actually hosts the search app
+
+def _search_with_browser(query: str, timeout: float) -> dict:
+    with open_page(missing_message=MISSING_PLAYWRIGHT) as page:
+        with trace.span("browser.goto", url=SEARCH_URL):
+            page.goto(SEARCH_URL, timeout=int(timeout * 1000), wait_until="domcontentloaded")
+
+        # Known-good selectors from earlier runs against this site version are tried first
+        memory = SelectorMemory("pl", site_version(page))
+
+        # Accept cookie banners if present (one wait for whichever banner shows up)
+        click_first(page, [
+            "button:has-text('Akceptuj')",
+            "button:has-text('Zaakceptuj')",
+            "button:has-text('Accept')",
+            "button:has-text('Zgadzam się')",
+        ], timeout=1.5, memory=memory, slot="cookie_button")
+
+        # Find the iframe that actually hosts the search app
+        known_frame = memory.get("frame")
+        if known_frame == ABSENT:
             target_frame = None
-            for _ in range(12):
-                for frame in page.frames:
-                    url = (frame.url or "").lower()
-                    if "registry/rpl" in url or "rpl" in frame.name.lower():
-                        target_frame = frame
-                        break
-                if target_frame:
-                    break
-                page.wait_for_timeout(250)
-
-            if target_frame is None:
-                target_frame = page.main_frame
-
-            # Locate the search input inside the target frame
-            field = None
-            selectors = [
-                "input[formcontrolname='phrase']",
-                "input[formcontrolname='query']",
-                "input[formcontrolname='searchPhrase']",
-                "input[placeholder*='szuk']",
-                "input[type='search']",
-                "input.mat-input-element",
-                "input[type='text']",
-            ]
-            for sel in selectors:
-                try:
-                    field = target_frame.wait_for_selector(
-                        sel, timeout=2000, state="visible"
-                    )
-                    if field:
-                        break
-                except PlaywrightTimeout:
-                    continue
-
-            if field is None:
-                raise SearchError("PL: could not locate the search box on the RPL page.")
-
-            field.fill("")
-            field.type(query)
-
-            clicked = False
-            for btn in [
+        else:
+            target_frame = wait_for_frame(
+                page,
+                lambda f: (bool(known_frame) and (f.url or "").startswith(known_frame))
+                or "registry/rpl" in (f.url or "").lower() or "rpl" in f.name.lower(),
+                timeout=3.0,
+            )
+
+        if target_frame is None:
+            target_frame = page.main_frame
+
+        # Locate the search input inside the target frame
+        selectors = [
+            "input[formcontrolname='phrase']",
+            "input[formcontrolname='query']",
+            "input[formcontrolname='searchPhrase']",
+            "input[placeholder*='szuk']",
+            "input[type='search']",
+            "input.mat-input-element",
+            "input[type='text']",
+        ]
+        _, field = first_match(target_frame, selectors, timeout=min(timeout, 10.0), memory=memory, slot="search_box")
+
+        if field is None:
+            # Whatever we learned no longer leads to the form; probe everything next time.
+            memory.reset()
+            memory.save()
+            raise SearchError("PL: could not locate the search box on the RPL page.")
+        if target_frame == page.main_frame:
+            memory.remember("frame", ABSENT)
+        else:
+            memory.remember("frame", url_pattern(target_frame.url))
+
+        field.fill("")
+        field.type(query)
+
+        # Register the response wait before submitting so a fast reply is not missed
+        with trace.span("browser.submit"), page.expect_response(
+            lambda r: r.url.startswith(API_SEARCH_PREFIX) and r.request.method == "POST",
+            timeout=int(timeout * 1000),
+        ) as response_info:
+            clicked = click_first(target_frame, [
                 "button[type='submit']",
                 "button:has-text('Szukaj')",
                 "button:has-text('Szukaj produktu')",
                 "button:has-text('Wyszukaj')",
                 "button.mat-raised-button",
-            ]:
-                try:
-                    target_frame.click(btn, timeout=1500)
-                    clicked = True
-                    break
-                except Exception:
-                    continue
+            ], timeout=1.5, memory=memory, slot="submit_button")
 
             if not clicked:
                 field.press("Enter")
+        data = response_info.value.json()
+        memory.save()
 
-            response = page.wait_for_response(
-                lambda r: r.url.startswith(API_SEARCH_PREFIX) and r.request.method == "POST",
-                timeout=int(timeout * 1000),
-            )
-            data = response.json()
-        finally:
-            browser.close()
-
-    records = data.get("content") or data.get("items") or []
-    results: List[Dict] = []
-
-    for item in records:
-        product_id = item.get("id") or item.get("medicinalProductId")
-        name = (
-            item.get("tradeName")
-            or item.get("fullName")
-            or item.get("name")
-            or item.get("displayName")
+    return data
+
+
+def _entry_from_item(item: dict) -> Result:
+    product_id = item.get("id") or item.get("medicinalProductId")
+    name = (
+        item.get("tradeName")
+        or item.get("fullName")
+        or item.get("name")
+        or item.get("displayName")
+    )
+    substances = item.get("activeSubstances") or item.get("substances") or []
+    inn = ", ".join(
+        s.get("name") if isinstance(s, dict) else str(s) for s in substances
+    ) or None
+    form = item.get("pharmaceuticalForm") or item.get("form")
+    strength = item.get("strength") or item.get("dose")
+    mah = item.get("marketingAuthorisationHolder") or item.get("mahName")
+
+    detail_url = None
+    if product_id:
+        detail_url = (
+            SEARCH_URL.rstrip("/") + f"/details/{product_id}"
         )
-        substances = item.get("activeSubstances") or item.get("substances") or []
-        inn = ", ".join(
-            s.get("name") if isinstance(s, dict) else str(s) for s in substances
-        ) or None
-        form = item.get("pharmaceuticalForm") or item.get("form")
-        strength = item.get("strength") or item.get("dose")
-        mah = item.get("marketingAuthorisationHolder") or item.get("mahName")
-
-        detail_url = None
-        if product_id:
-            detail_url = (
-                SEARCH_URL.rstrip("/") + f"/details/{product_id}"
+
+    return Result(
+        product_name=name,
+        inn=inn,
+        form=form,
+        strength=strength,
+        mah=mah,
+        detail_url=detail_url,
+    )
+
+
+def _apply_documents(entry: MutableMapping, docs: list) -> None:
+    for doc in docs or []:
+        doc_type = (doc.get("documentType") or "").lower()
+        url = doc.get("downloadUrl")
+        if not url:
+            continue
+        full_url = urljoin(SEARCH_URL, url)
+        if "rcp" in doc_type or "charakterystyka" in doc_type:
+            entry["spc_url"] = full_url
+        if "ulotka" in doc_type or "pil" in doc_type or "patient" in doc_type:
+            entry["pil_url"] = full_url
+
+
+def _items(data: dict) -> list:
+    return data.get("content") or data.get("items") or []
+
+
+def _more_pages(query: str, timeout: float, limit: int, first: dict, have: int,
+                end: Optional[float] = None) -> Iterator[dict]:
+    """
+    Search API pages after `first`, in order, while fewer than `limit` items are in
+    hand and `end` (see base.search_end) has not passed. With a page count (Spring's
+    totalPages) the pages still needed are requested together; without one the next
+    page is requested only after a full page. A page that fails before `end` raises
+    SearchError.
+    """
+    size = int(first.get("size") or len(_items(first)) or 1)
+    total_pages = first.get("totalPages")
+    last = total_pages if isinstance(total_pages, int) else (2 if len(_items(first)) >= size else 1)
+    page = 1
+    while have < limit and page < min(last, base.MAX_PAGES) and (end is None or time.monotonic() < end):
+        batch = range(page, min(last, base.MAX_PAGES, page + -(-(limit - have) // size)))
+        pages = base.iter_ordered(lambda p: _search_api(query, timeout=timeout, limit=limit, page=p), batch,
+                                  url_of=lambda p: API_SEARCH_PREFIX, deadline=end)
+        try:
+            for p, data in zip(batch, pages):
+                if data is None:
+                    if base.deadline_passed(end):
+                        return
+                    raise SearchError(f"PL: search API page {p} failed")
+                yield data
+                have += len(_items(data))
+                if not isinstance(total_pages, int) and len(_items(data)) >= size:
+                    last = max(last, p + 2)
+                if have >= limit:
+                    break
+        finally:
+            pages.close()
+        page = batch.stop
+
+
+def _iter_listed(*, query: str, timeout: float, limit: int, browser: bool,
+                 end: Optional[float] = None) -> Iterator[tuple[Result, list[str]]]:
+    # Requests-only path first; the browser is only a fallback when the API refuses us.
+    timeout = base.time_left(end, timeout, "PL")
+    try:
+        first = _search_api(query, timeout=timeout, limit=limit)
+    except SearchError:
+        base.time_left(end, timeout, "PL")  # a request cut short by the deadline reports the deadline
+        raise
+    except _ApiRejected as e:
+        if not browser:
+            raise SearchError(
+                f"PL: direct API search was rejected ({e}). Re-run with --browser "
+                "after installing 'medreg[browser]' and running 'playwright install chromium'."
             )
+        # The browser yields only the page the web app asked for.
+        pages = iter([_search_with_browser(query=query, timeout=timeout)])
+    else:
+        pages = itertools.chain([first], _more_pages(query, timeout, limit, first, len(_items(first)), end))
+    seen = set()
+    count = 0
+    for data in pages:
+        for item in _items(data):
+            product_id = item.get("id") or item.get("medicinalProductId")
+            # Pages can shift while they are fetched; a product seen on an earlier page is skipped.
+            if product_id and product_id in seen:
+                continue
+            seen.add(product_id)
+            sources = [API_PRODUCT.format(product_id=product_id), API_DOCUMENTS.format(product_id=product_id)] if product_id else []
+            yield _entry_from_item(item), sources
+            count += 1
+            if count >= limit:
+                return
+
+
+def list_results(*, query: str, timeout: float, limit: int, browser: bool = False) -> list[tuple[Result, list[str]]]:
+    """
+    Search results with their core fields, each paired with the URLs its enrichment
+    comes from (product and documents API). Pages through the API until `limit`
+    unique products are found. Used by iter_search and `medreg sync`.
+    """
+    return list(_iter_listed(query=query, timeout=timeout, limit=limit, browser=browser))
+
+
+def apply_source(result: MutableMapping, url: str, resp) -> None:
+    """Add the fields found in a source response (see list_results) to result."""
+    payload = resp.json()
+    if url.endswith("/documents"):
+        _apply_documents(result, payload)
+    else:
+        result["mah"] = result.get("mah") or payload.get("marketingAuthorisationHolder")
+
 
-        entry: Dict[str, Optional[str]] = {
-            "product_name": name,
-            "inn": inn,
-            "form": form,
-            "strength": strength,
-            "mah": mah,
-            "detail_url": detail_url,
-        }
-
-        if product_id:
-            try:
-                detail = base.simple_get(
-                    API_PRODUCT.format(product_id=product_id), timeout=timeout
-                ).json()
-                entry["mah"] = entry["mah"] or detail.get("marketingAuthorisationHolder")
-            except Exception:
-                pass
-
-            try:
-                docs = base.simple_get(
-                    API_DOCUMENTS.format(product_id=product_id), timeout=timeout
-                ).json() or []
-                for doc in docs:
-                    doc_type = (doc.get("documentType") or "").lower()
-                    url = doc.get("downloadUrl")
-                    if not url:
-                        continue
-                    full_url = urljoin(SEARCH_URL, url)
-                    if "rcp" in doc_type or "charakterystyka" in doc_type:
-                        entry["spc_url"] = full_url
-                    if "ulotka" in doc_type or "pil" in doc_type or "patient" in doc_type:
-                        entry["pil_url"] = full_url
-            except Exception:
-                pass
+def _source_fields(url: str) -> tuple[str, ...]:
+    """Fields apply_source takes from url's response."""
+    return ("spc_url", "pil_url") if url.endswith("/documents") else ("mah",)
 
+
+def iter_search(*, query: str, timeout: float, browser: bool, lang: Optional[str], limit: int,
+                offline: bool = False, deadline: Optional[float] = None) -> Iterator[ResultEvent]:
+    if offline:
+        raise SearchError("PL: no offline mirror is available for this registry.")
+    end = base.search_end(deadline)
+    listed = []
+    results: List[Result] = []
+    for i, (entry, sources) in enumerate(_iter_listed(query=query, timeout=timeout, limit=limit, browser=browser,
+                                                      end=end)):
+        listed.append((entry, sources))
         results.append(entry)
-        if len(results) >= limit:
-            break
+        yield ResultEvent("result", i, entry.copy())
 
-    return results
+    # Product and document lookups are independent: fetch both for every result concurrently.
+    jobs = [(i, url) for i, (_, sources) in enumerate(listed) for url in sources]
 
+    def fetch(job):
+        return base.simple_get(job[1], timeout=timeout, ttl=API_CACHE_TTL)
 
-def search(*, query: str, timeout: float, browser: bool, lang: Optional[str], limit: int) -> list[dict]:
-    if not browser:
-        raise SearchError(
-            "PL: registry is JavaScript-driven. Re-run with --browser "
-            "after installing 'medreg[browser]' and running 'playwright install chromium'."
-        )
-    return _search_with_browser(query=query, timeout=timeout, limit=limit)
\ No newline at end of file
+    answers = base.iter_bounded(fetch, jobs, url_of=lambda job: job[1],
+                                deadline=base.earliest(time.monotonic() + timeout, end))
+    answered = set()
+    for j, resp in answers:
+        answered.add(j)
+        i, url = jobs[j]
+        entry = results[i]
+        before = dict(entry)
+        try:
+            apply_source(entry, url, resp)
+        except Exception:
+            pass
+        changed = {k: v for k, v in entry.items() if before.get(k) != v}
+        if changed:
+            yield ResultEvent("update", i, changed)
+
+    # Sources that did not answer in time (or failed) leave their fields incomplete.
+    missing: Dict[int, list] = {}
+    for j, (i, url) in enumerate(jobs):
+        if j not in answered:
+            missing.setdefault(i, []).extend(f for f in _source_fields(url) if not results[i].get(f))
+    for i, fields in sorted(missing.items()):
+        if fields:
+            yield ResultEvent("update", i, {"incomplete": fields})
+
+
+def search(*, query: str, timeout: float, browser: bool, lang: Optional[str], limit: int,
+           offline: bool = False, deadline: Optional[float] = None) -> list[Result]:
+    return base.collect(iter_search(query=query, timeout=timeout, browser=browser, lang=lang, limit=limit,
+                                    offline=offline, deadline=deadline))
@@ -0,0 +1,193 @@
+from __future__ import annotations
+import asyncio
+import functools
+import itertools
+import queue
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import AsyncIterator, Optional
+
+from .adapters import ResultEvent, SearchError, get_adapter
+from .records import Result
+
+# asyncio front end for embedding medreg in an event loop:
+#
+#     results = await medreg.asearch("fr", "paracetamol", deadline=5)
+#     async for ev in medreg.aiter_search("pl", "tramadol"): ...
+#
+# The adapters' iter_search() generators are stepped on shared executors, so the
+# loop never blocks and results arrive as each step completes. HTTP work shares the
+# pooled, rate-limited requests.Session; browser searches run on a small set of
+# threads that each keep one Chromium warm (Playwright's sync API is bound to the
+# thread that started it). Steps of searches already under way run ahead of the
+# first step of new ones, so under load calls finish one after another instead of
+# all waiting on each other. Cancelling a call, or hitting its deadline, abandons
+# the outstanding detail/document requests of that search. Per-host limits
+# (base.PER_HOST_LIMIT in flight, utils.http rate limits) hold across all calls.
+
+HTTP_WORKERS = 32
+BROWSER_WORKERS = 2
+# Adapters that may drive a browser when called with browser=True
+BROWSER_ADAPTERS = frozenset({"de", "pl"})
+# Seconds past a deadline that asearch() waits for the adapter's own incomplete
+# markers before returning what it has collected
+DEADLINE_GRACE = 0.25
+
+_DONE = object()
+_FIRST_STEP, _NEXT_STEP = 1, 0  # step priorities: lower runs first
+_pools: Optional[tuple[_StepPool, ThreadPoolExecutor]] = None
+_pools_lock = threading.Lock()
+
+class _StepPool:
+    """Threads running generator steps by (priority, arrival); submit() returns a Future."""
+
+    def __init__(self, workers: int, thread_name_prefix: str):
+        self._queue: queue.PriorityQueue = queue.PriorityQueue()
+        self._order = itertools.count()
+        self._threads = [threading.Thread(target=self._work, name=f"{thread_name_prefix}_{i}", daemon=True)
+                         for i in range(workers)]
+        for t in self._threads:
+            t.start()
+
+    def submit(self, fn, *args, priority: int = _FIRST_STEP) -> Future:
+        fut: Future = Future()
+        self._queue.put((priority, next(self._order), fut, fn, args))
+        return fut
+
+    def _work(self) -> None:
+        while True:
+            _, _, fut, fn, args = self._queue.get()
+            if fut is None:
+                return
+            if not fut.set_running_or_notify_cancel():
+                continue
+            try:
+                fut.set_result(fn(*args))
+            except BaseException as e:
+                fut.set_exception(e)
+
+    def shutdown(self, wait: bool = True, cancel_futures: bool = False) -> None:
+        if cancel_futures:
+            while True:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item[2] is not None:
+                    item[2].cancel()
+        for _ in self._threads:
+            self._queue.put((_FIRST_STEP + 1, next(self._order), None, None, ()))
+        if wait:
+            for t in self._threads:
+                t.join()
+
+def _get_pools() -> tuple[_StepPool, ThreadPoolExecutor]:
+    global _pools
+    with _pools_lock:
+        if _pools is None:
+            from .utils.browser import keep_warm_in_thread
+            _pools = (
+                _StepPool(HTTP_WORKERS, thread_name_prefix="medreg-aio"),
+                ThreadPoolExecutor(max_workers=BROWSER_WORKERS, thread_name_prefix="medreg-aio-browser",
+                                   initializer=keep_warm_in_thread),
+            )
+        return _pools
+
+async def aiter_search(country: str, query: str, *, timeout: float = 15.0, browser: bool = False,
+                       lang: Optional[str] = None, limit: int = 15, offline: bool = False,
+                       deadline: Optional[float] = None, fuzzy: bool = False) -> AsyncIterator[ResultEvent]:
+    """
+    Async counterpart of adapter.iter_search(); raises SearchError like the sync API.
+    `fuzzy` searches for the normalized query, as `medreg --fuzzy` does.
+    """
+    adapter = get_adapter(country)
+    http_pool, browser_pool = _get_pools()
+    if fuzzy:
+        from .normalize import normalized
+        query = await asyncio.wrap_future(http_pool.submit(normalized, query))
+    gen = adapter.iter_search(query=query, timeout=timeout, browser=browser, lang=lang, limit=limit, offline=offline,
+                              deadline=deadline)
+    # The first step issues the search itself (and the browser fallback); later steps only
+    # wait for enrichment requests.
+    if browser and country.lower() in BROWSER_ADAPTERS:
+        submit = browser_pool.submit
+    else:
+        submit = http_pool.submit
+    step = None
+    try:
+        while True:
+            step = submit(next, gen, _DONE)
+            ev = await asyncio.wrap_future(step)
+            if ev is _DONE:
+                return
+            yield ev
+            submit = functools.partial(http_pool.submit, priority=_NEXT_STEP)
+    finally:
+        # Close the generator once its current step (if any) has returned; that cancels
+        # its queued requests. Cancelling the await does not interrupt a running step.
+        if step is not None:
+            step.add_done_callback(lambda _: gen.close())
+
+async def _collect(events: AsyncIterator[ResultEvent], results: list[Result]) -> list[Result]:
+    try:
+        async for ev in events:
+            if ev.kind == "result":
+                results.append(Result.from_mapping(ev.fields))
+            else:
+                results[ev.index].update(ev.fields)
+    finally:
+        await events.aclose()
+    return results
+
+async def asearch(country: str, query: str, *, timeout: float = 15.0, browser: bool = False,
+                  lang: Optional[str] = None, limit: int = 15, offline: bool = False,
+                  deadline: Optional[float] = None, fuzzy: bool = False) -> list[Result]:
+    """
+    Search one registry without blocking the event loop. `timeout` applies to each
+    request; `deadline` (seconds) bounds the whole call: it returns the results listed
+    by then, and those whose enrichment had not finished carry an "incomplete" list.
+    SearchError is raised when nothing was listed in time, as by the sync adapters.
+    `fuzzy` normalizes the query and learns INN/brand terms from the results.
+    """
+    events = aiter_search(country, query, timeout=timeout, browser=browser, lang=lang, limit=limit, offline=offline,
+                          deadline=deadline, fuzzy=fuzzy)
+    results: list[Result] = []
+    if deadline is None:
+        return _learned(await _collect(events, results), fuzzy)
+    collecting = asyncio.ensure_future(_collect(events, results))
+    done, _ = await asyncio.wait({collecting}, timeout=deadline + DEADLINE_GRACE)
+    if collecting in done:
+        return _learned(collecting.result(), fuzzy)
+    # The search's own steps are behind (a busy pool, a browser page): stop waiting and
+    # mark what its update events would have filled in.
+    collecting.cancel()
+    await asyncio.wait({collecting})
+    if not results:
+        raise SearchError(f"{country.upper()}: search deadline exceeded before any results")
+    fields = getattr(get_adapter(country), "ENRICHED_FIELDS", ())
+    for r in results:
+        missing = [f for f in fields if not r.get(f)]
+        if missing and not r.get("incomplete"):
+            r["incomplete"] = missing
+    return _learned(results, fuzzy)
+
+def _learned(results: list[Result], fuzzy: bool) -> list[Result]:
+    # The vocabulary file is appended to off the loop, without holding up the caller
+    if fuzzy and results:
+        from .normalize import learn
+        _get_pools()[0].submit(learn, [dict(r) for r in results], priority=_NEXT_STEP)
+    return results
+
+def shutdown() -> None:
+    """Stop the shared executors and close their warm browsers."""
+    global _pools
+    with _pools_lock:
+        pools, _pools = _pools, None
+    if pools is None:
+        return
+    http_pool, browser_pool = pools
+    from .utils.browser import close_thread_browser
+    for _ in range(BROWSER_WORKERS):
+        browser_pool.submit(close_thread_browser)
+    browser_pool.shutdown(wait=True)
+    http_pool.shutdown(wait=False, cancel_futures=True)
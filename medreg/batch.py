@@ -0,0 +1,289 @@
+from __future__ import annotations
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import IO, Iterator, List, Optional
+
+from .adapters import get_adapter, SearchError
+from .records import dumps
+
+# `medreg batch`: resolve many (query, country) pairs in one process.
+# Input rows are streamed and only a bounded number of jobs is in flight, so memory
+# does not grow with the input. Output is JSONL, one record per result, written as
+# soon as each job finishes. A checkpoint lets an interrupted run resume; a job that
+# finished right before the interruption may be written twice (at-least-once). Jobs
+# whose search failed are kept in the checkpoint and retried on resume, after their
+# earlier error record.
+
+DEFAULT_CONCURRENCY = {"fr": 4, "pl": 4, "de": 1}
+CHECKPOINT_INTERVAL = 1.0
+
+class Job:
+    __slots__ = ("row", "row_id", "country", "query")
+
+    def __init__(self, row: int, row_id, country: str, query: str):
+        self.row = row
+        self.row_id = row_id
+        self.country = country
+        self.query = query
+
+    @property
+    def key(self) -> str:
+        return f"{self.row}:{self.country}"
+
+def parse_rows(lines: Iterator[str], default_countries: List[str]) -> Iterator[tuple[int, object, str, List[str]]]:
+    """Yield (row number, row id, query, countries); plain lines use the default countries."""
+    for n, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        if line.startswith("{"):
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                raise SearchError(f"batch: line {n} is not valid JSON: {e}")
+            query = str(row.get("query") or "").strip()
+            countries = row.get("countries") or row.get("country") or default_countries
+            if isinstance(countries, str):
+                countries = countries.split(",")
+            countries = [c.strip().lower() for c in countries if c.strip()]
+            row_id = row.get("id")
+        else:
+            query, countries, row_id = line, default_countries, None
+        if not countries:
+            raise SearchError(f"batch: line {n} has no country; pass -c/--country or a 'country' field")
+        yield n, row_id, query, countries
+
+class Checkpoint:
+    """
+    Rows up to `done_through` are complete; `done` holds finished jobs past that
+    mark. `failed` jobs count as finished for the mark but are not skipped.
+    """
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self.done_through = 0
+        self.done: set[str] = set()
+        self.failed: set[str] = set()
+        self._row_jobs: dict[int, int] = {}
+        self._last_row = 0
+        self._lock = threading.Lock()
+        self._saved_at = 0.0
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                state = json.load(f)
+            self.done_through = int(state.get("done_through", 0))
+            self.done = set(state.get("done", []))
+            self.failed = set(state.get("failed", []))
+
+    def skip(self, job: Job) -> bool:
+        if job.key in self.failed:
+            return False
+        return job.row <= self.done_through or job.key in self.done
+
+    def add_row(self, row: int, jobs: int) -> None:
+        with self._lock:
+            self._row_jobs[row] = jobs
+            self._last_row = row
+            self._advance()
+
+    def finish(self, job: Job, ok: bool = True) -> None:
+        with self._lock:
+            self.done.add(job.key)
+            if ok:
+                self.failed.discard(job.key)
+            else:
+                self.failed.add(job.key)
+            self._row_jobs[job.row] -= 1
+            self._advance()
+            if time.monotonic() - self._saved_at >= CHECKPOINT_INTERVAL:
+                self._save()
+
+    def close(self) -> None:
+        with self._lock:
+            self._save()
+
+    def _advance(self) -> None:
+        # Rows are registered in order, so the watermark moves while the oldest row is complete.
+        while self._row_jobs:
+            row = min(self._row_jobs)
+            if self._row_jobs[row] > 0:
+                self.done_through = max(self.done_through, row - 1)
+                break
+            del self._row_jobs[row]
+            self.done_through = max(self.done_through, row)
+        else:
+            self.done_through = max(self.done_through, self._last_row)
+        prefix_done = self.done_through
+        self.done = {k for k in self.done if int(k.split(":", 1)[0]) > prefix_done}
+
+    def _save(self) -> None:
+        self._saved_at = time.monotonic()
+        if not self.path:
+            return
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"done_through": self.done_through, "done": sorted(self.done), "failed": sorted(self.failed)}, f)
+        os.replace(tmp, self.path)
+
+class Writer:
+    def __init__(self, out: IO[str]):
+        self.out = out
+        self._lock = threading.Lock()
+
+    def write(self, records: List[dict]) -> None:
+        lines = "".join(dumps(r) + "\n" for r in records)
+        with self._lock:
+            self.out.write(lines)
+            self.out.flush()
+
+def _records(job: Job, results: Optional[list], error: Optional[str], searched: Optional[str] = None) -> List[dict]:
+    head = {"row": job.row, "country": job.country, "query": job.query}
+    if job.row_id is not None:
+        head["id"] = job.row_id
+    if searched is not None and searched != job.query:
+        head["normalized_query"] = searched
+    if error is not None:
+        return [dict(head, error=error)]
+    if not results:
+        return [dict(head, rank=0, result=None)]
+    return [dict(head, rank=i, result=r) for i, r in enumerate(results, 1)]
+
+def run_batch(rows: Iterator[tuple[int, object, str, List[str]]], writer: Writer, checkpoint: Checkpoint, *,
+              timeout: float, browser: bool, lang: Optional[str], limit: int,
+              concurrency: dict[str, int], offline: bool = False, deadline: Optional[float] = None,
+              fuzzy: bool = False) -> int:
+    pools: dict[str, ThreadPoolExecutor] = {}
+    total_workers = sum(concurrency.values())
+    inflight = threading.BoundedSemaphore(max(2, 2 * total_workers))
+    failures = 0
+    failures_lock = threading.Lock()
+    if fuzzy:
+        from . import normalize
+
+    def run(job: Job, adapter) -> None:
+        nonlocal failures
+        query = job.query
+        try:
+            try:
+                if fuzzy:
+                    query = normalize.normalized(query)
+                results = adapter.search(query=query, timeout=timeout, browser=browser, lang=lang, limit=limit,
+                                         offline=offline, deadline=deadline)
+            except Exception as e:
+                with failures_lock:
+                    failures += 1
+                writer.write(_records(job, None, str(e), query))
+                checkpoint.finish(job, ok=False)
+            else:
+                if fuzzy and results:
+                    normalize.learn(results)
+                writer.write(_records(job, results, None, query))
+                checkpoint.finish(job)
+        finally:
+            inflight.release()
+
+    try:
+        for row, row_id, query, countries in rows:
+            jobs = [Job(row, row_id, c, query) for c in dict.fromkeys(countries)]
+            checkpoint.add_row(row, sum(1 for j in jobs if not checkpoint.skip(j)))
+            for job in jobs:
+                if checkpoint.skip(job):
+                    continue
+                inflight.acquire()
+                try:
+                    adapter = get_adapter(job.country)
+                except SearchError as e:
+                    writer.write(_records(job, None, str(e)))
+                    checkpoint.finish(job)
+                    inflight.release()
+                    with failures_lock:
+                        failures += 1
+                    continue
+                pool = pools.get(job.country)
+                if pool is None:
+                    workers = concurrency.get(job.country, 1)
+                    pool = pools[job.country] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"medreg-{job.country}")
+                pool.submit(run, job, adapter)
+    finally:
+        for pool in pools.values():
+            pool.shutdown(wait=True)
+        checkpoint.close()
+    return failures
+
+def _parse_concurrency(spec: Optional[str]) -> dict[str, int]:
+    limits = dict(DEFAULT_CONCURRENCY)
+    for part in (spec or "").split(","):
+        if not part.strip():
+            continue
+        country, _, n = part.partition("=")
+        limits[country.strip().lower()] = max(1, int(n))
+    return limits
+
+def build_argparser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(prog="medreg batch", description="Search many queries and stream results as JSONL.")
+    p.add_argument("input", nargs="?", default="-", help="File with one query per line or JSONL rows (default: stdin)")
+    p.add_argument("-o", "--output", default="-", help="JSONL output file (default: stdout)")
+    p.add_argument("-c", "--country", action="append", default=[],
+                   help="Country for plain-text rows; repeat or comma-separate (e.g. -c fr,de)")
+    p.add_argument("--concurrency", help="Per-registry parallelism, e.g. fr=8,pl=4,de=1")
+    p.add_argument("--checkpoint", help="Checkpoint file (default: <output>.ckpt when writing to a file)")
+    p.add_argument("--resume", action="store_true", help="Skip work recorded in the checkpoint and append to the output")
+    p.add_argument("--lang", help="Preferred UI language where supported")
+    p.add_argument("--browser", action="store_true", help="Allow headless browser for JS-heavy registries")
+    p.add_argument("--timeout", type=float, default=15.0, help="Per-request timeout seconds (default: 15)")
+    p.add_argument("--limit", type=int, default=15, help="Max results per query and country (default: 15)")
+    p.add_argument("--deadline", type=float, help="Seconds per search; later fields are listed under 'incomplete'")
+    p.add_argument("--hedge", action="store_true", help="Re-send requests that are slower than the endpoint's usual p95")
+    p.add_argument("--offline", action="store_true", help="Answer from local mirrors only (FR)")
+    p.add_argument("--fuzzy", action="store_true", help="Normalize queries (salts, misspellings) as medreg --fuzzy does")
+    p.add_argument("--cache-dir", help="Enable the persistent HTTP cache in this directory")
+    p.add_argument("--no-cache", action="store_true", help="Disable the HTTP cache even if MEDREG_CACHE_DIR is set")
+    p.add_argument("--refresh", action="store_true", help="Revalidate every cached response with the registry")
+    return p
+
+def main(argv: List[str]) -> int:
+    args = build_argparser().parse_args(argv)
+    from .utils import cache as http_cache
+    from .utils import latency
+    http_cache.configure(cache_dir=args.cache_dir, enabled=not args.no_cache, refresh=args.refresh)
+    latency.configure(hedge=args.hedge)
+
+    countries = [c.strip().lower() for spec in args.country for c in spec.split(",") if c.strip()]
+    try:
+        concurrency = _parse_concurrency(args.concurrency)
+    except ValueError:
+        print(f"Error: invalid --concurrency '{args.concurrency}'", file=sys.stderr)
+        return 2
+
+    ckpt_path = args.checkpoint or (args.output + ".ckpt" if args.output != "-" else None)
+    if args.resume and not ckpt_path:
+        print("Error: --resume needs --checkpoint or --output FILE", file=sys.stderr)
+        return 2
+    if not args.resume and ckpt_path and os.path.exists(ckpt_path):
+        os.remove(ckpt_path)
+    checkpoint = Checkpoint(ckpt_path)
+
+    src = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    out = sys.stdout if args.output == "-" else open(args.output, "a" if args.resume else "w", encoding="utf-8")
+    try:
+        rows = parse_rows(src, countries)
+        failures = run_batch(rows, Writer(out), checkpoint, timeout=args.timeout, browser=args.browser,
+                             lang=args.lang, limit=args.limit, concurrency=concurrency, offline=args.offline,
+                             deadline=args.deadline, fuzzy=args.fuzzy)
+    except SearchError as e:
+        print(f"Batch failed: {e}", file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        print("Interrupted; re-run with --resume to continue.", file=sys.stderr)
+        return 130
+    finally:
+        if src is not sys.stdin:
+            src.close()
+        if out is not sys.stdout:
+            out.close()
+    return 1 if failures else 0
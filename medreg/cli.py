@@ -1,11 +1,18 @@
 #!/usr/bin/env python3
 import argparse
-import json
 import re
 import sys
-from typing import List, Optional
+from typing import TYPE_CHECKING, List, Optional
 
-from .adapters import get_adapter, SearchError
+from .adapters import SearchError, check_country
+from .utils import trace
+
+if TYPE_CHECKING:
+    from .records import Result
+
+# Keep this module's imports light: `medreg --help`, usage errors and unsupported
+# countries should return without loading requests, bs4/lxml or the adapters.
+# Those are imported where a search actually runs.
 
 def parse_country(argv: List[str]) -> tuple[Optional[str], List[str]]:
     """
@@ -31,43 +38,123 @@ def build_argparser() -> argparse.ArgumentParser:
     p.add_argument("query", nargs="+", help="Drug name (INN / brand / synonym)")
     p.add_argument("-c", "--country", help="ISO 2-letter country code, e.g., de, pl, fr")
     p.add_argument("--json", action="store_true", help="Output JSON instead of text")
+    p.add_argument("--compact", action="store_true", help="One-line JSON with --json")
     p.add_argument("--lang", help="Preferred UI language where supported (e.g., en,de,pl,fr)")
     p.add_argument("--browser", action="store_true",
                    help="Allow headless browser for JS-heavy registries (requires 'medreg[browser]' + 'playwright install')")
     p.add_argument("--timeout", type=float, default=15.0, help="Per-request timeout seconds (default: 15)")
     p.add_argument("--limit", type=int, default=15, help="Max results to return/display (default: 15)")
+    p.add_argument("--deadline", type=float, metavar="SECONDS",
+                   help="Time budget for the whole search; fields not fetched by then are listed as incomplete")
+    p.add_argument("--hedge", action="store_true",
+                   help="Re-send a request that is slower than the endpoint's usual p95 and take the first answer")
+    p.add_argument("--cache-dir", help="Enable the persistent HTTP cache in this directory (or set MEDREG_CACHE_DIR)")
+    p.add_argument("--no-cache", action="store_true", help="Disable the HTTP cache even if MEDREG_CACHE_DIR is set")
+    p.add_argument("--refresh", action="store_true", help="Revalidate every cached response with the registry")
+    p.add_argument("--fuzzy", action="store_true",
+                   help="Normalize the query first: drop salt forms and correct spellings against known INNs/brands")
+    p.add_argument("--offline", action="store_true", help="Answer from the local mirror only (FR; build it with 'medreg mirror fr')")
+    p.add_argument("--no-daemon", action="store_true", help="Do not forward to a running 'medreg serve' daemon")
+    p.add_argument("--stream", action="store_true",
+                   help="Print each result as soon as it is found (JSON Lines with --json); searches in-process")
+    p.add_argument("--profile", action="store_true",
+                   help="Print a per-phase timing breakdown (HTTP, cache, parsing, browser steps) to stderr")
+    p.add_argument("--trace", metavar="FILE", help="Write recorded spans to FILE (implies in-process search)")
+    p.add_argument("--trace-format", choices=("json", "chrome"), default="json",
+                   help="Span file format; 'chrome' loads in chrome://tracing or Perfetto (default: json)")
     return p
 
-def print_human(results: list[dict], query: str, country: str) -> None:
+def print_header(query: str, country: str) -> None:
     print(f'Country: {country.upper()}')
     print(f'Query:   "{query}"')
+
+def print_human(results: list[dict], query: str, country: str) -> None:
+    print_header(query, country)
     if not results:
         print("No results.")
         return
     print("")
     for i, r in enumerate(results, 1):
-        name = r.get("product_name") or r.get("name") or "(unknown)"
-        print(f"{i}. {name}")
-        if r.get("inn"):
-            print(f"   INN: {r['inn']}")
-        if r.get("form") or r.get("strength"):
-            form = r.get("form")
-            strength = r.get("strength")
-            details = " | ".join([x for x in [form, strength] if x])
-            if details:
-                print(f"   {details}")
-        if r.get("mah"):
-            print(f"   MAH: {r['mah']}")
-        if r.get("spc_url"):
-            print(f"   SmPC:  {r['spc_url']}")
-        if r.get("pil_url"):
-            print(f"   PIL:   {r['pil_url']}")
-        if r.get("detail_url"):
-            print(f"   Detail:{(' ' + r['detail_url'])}")
-        print("")
+        print_result(i, r)
+
+def print_result(i: int, r: dict) -> None:
+    name = r.get("product_name") or r.get("name") or "(unknown)"
+    print(f"{i}. {name}")
+    if r.get("inn"):
+        print(f"   INN: {r['inn']}")
+    if r.get("form") or r.get("strength"):
+        form = r.get("form")
+        strength = r.get("strength")
+        details = " | ".join([x for x in [form, strength] if x])
+        if details:
+            print(f"   {details}")
+    if r.get("mah"):
+        print(f"   MAH: {r['mah']}")
+    if r.get("spc_url"):
+        print(f"   SmPC:  {r['spc_url']}")
+    if r.get("pil_url"):
+        print(f"   PIL:   {r['pil_url']}")
+    if r.get("detail_url"):
+        print(f"   Detail:{(' ' + r['detail_url'])}")
+    if r.get("incomplete"):
+        print(f"   Incomplete: {', '.join(FIELD_LABELS.get(f, f) for f in r['incomplete'])}")
+    print("")
+
+UPDATE_LABELS = {"mah": "MAH", "spc_url": "SmPC", "pil_url": "PIL"}
+FIELD_LABELS = dict(UPDATE_LABELS, inn="INN", form="form", strength="strength")
+
+def stream_results(adapter, args, query: str, country: str) -> "list[Result]":
+    """
+    Print results as the adapter yields them: core fields first, enrichment
+    (SmPC/PIL links, MAH) as follow-up lines, or one JSON object per event with
+    --json. Returns the final results.
+    """
+    from . import records
+    from .records import Result
+
+    results: list[Result] = []
+    if not args.json:
+        print_header(query, country)
+        print("", flush=True)
+    events = adapter.iter_search(query=query, timeout=args.timeout, browser=args.browser, lang=args.lang,
+                                 limit=args.limit, offline=args.offline, deadline=args.deadline)
+    for ev in events:
+        if ev.kind == "result":
+            results.append(Result.from_mapping(ev.fields))
+        else:
+            results[ev.index].update(ev.fields)
+        if args.json:
+            print(records.merged_json({"event": ev.kind, "index": ev.index}, ev.fields), flush=True)
+        elif ev.kind == "result":
+            print_result(ev.index + 1, ev.fields)
+        else:
+            for key, value in ev.fields.items():
+                if value and key in UPDATE_LABELS:
+                    print(f"   [{ev.index + 1}] {UPDATE_LABELS[key]}: {value}")
+                elif key == "incomplete":
+                    print(f"   [{ev.index + 1}] Incomplete: {', '.join(FIELD_LABELS.get(f, f) for f in value)}")
+            sys.stdout.flush()
+    if not results and not args.json:
+        print("No results.")
+    return results
 
 def main(argv: Optional[List[str]] = None) -> int:
     argv = argv if argv is not None else sys.argv[1:]
+    if argv and argv[0] == "serve":
+        from .serve import main as serve_main
+        return serve_main(argv[1:])
+    if argv and argv[0] == "mirror":
+        from .mirror import main as mirror_main
+        return mirror_main(argv[1:])
+    if argv and argv[0] == "batch":
+        from .batch import main as batch_main
+        return batch_main(argv[1:])
+    if argv and argv[0] == "sync":
+        from .sync import main as sync_main
+        return sync_main(argv[1:])
+    if argv and argv[0] == "fetch-docs":
+        from .documents import main as fetch_docs_main
+        return fetch_docs_main(argv[1:])
 
     # Parse country shorthands like -de/-pl/-fr
     country_dash, rest = parse_country(argv)
@@ -82,26 +169,84 @@ def main(argv: Optional[List[str]] = None) -> int:
     query = " ".join(args.query).strip()
 
     try:
-        adapter = get_adapter(country)
+        country = check_country(country)
     except SearchError as e:
         print(f"Search failed: {e}", file=sys.stderr)
         return 1
 
+    if args.profile or args.trace:
+        trace.enable()
+
+    original_query = query
+    if args.fuzzy:
+        from .normalize import load_index
+        resolution = load_index().resolve(query)
+        if resolution.changed and resolution.query:
+            query = resolution.query
+            if not args.json:
+                print(f'Searching for "{query}" (normalized from "{original_query}")', file=sys.stderr)
+
+    payload = None
+    # Cache overrides, profiling and streaming only apply in-process, so they bypass the daemon.
+    use_daemon = not (args.no_daemon or args.cache_dir or args.no_cache or args.refresh or trace.enabled()
+                      or args.stream or args.hedge)
     try:
-        results = adapter.search(
-            query=query,
-            timeout=args.timeout,
-            browser=args.browser,
-            lang=args.lang,
-            limit=args.limit,
-        )
+        if use_daemon:
+            from .client import forward
+            payload = forward(country=country, query=query, timeout=args.timeout, browser=args.browser,
+                              lang=args.lang, limit=args.limit, offline=args.offline, deadline=args.deadline)
+        if payload is None:
+            from .adapters import get_adapter
+            from .utils import cache as http_cache
+            from .utils import latency
+            adapter = get_adapter(country)
+            http_cache.configure(cache_dir=args.cache_dir, enabled=not args.no_cache, refresh=args.refresh)
+            latency.configure(hedge=args.hedge)
+            if args.stream:
+                results = stream_results(adapter, args, query, country)
+            else:
+                results = adapter.search(
+                    query=query,
+                    timeout=args.timeout,
+                    browser=args.browser,
+                    lang=args.lang,
+                    limit=args.limit,
+                    offline=args.offline,
+                    deadline=args.deadline,
+                )
+            payload = {"country": country, "query": query, "results": results}
     except SearchError as e:
         print(f"Search failed: {e}", file=sys.stderr)
         return 1
+    finally:
+        if trace.enabled():
+            if args.profile:
+                trace.print_summary(sys.stderr)
+                from .utils.http import pool_stats
+                for host, st in sorted(pool_stats().items()):
+                    print(f"  keep-alive {host}: {st['requests']} requests over {st['connections']} connections",
+                          file=sys.stderr)
+                from .utils import latency
+                for name, st in sorted(latency.stats().items()):
+                    print(f"  latency {name}: p50 {st['p50_ms']} ms, p95 {st['p95_ms']} ms, p99 {st['p99_ms']} ms "
+                          f"({st['samples']} samples)", file=sys.stderr)
+            if args.trace:
+                trace.export(args.trace, args.trace_format)
 
-    payload = {"country": country, "query": query, "results": results}
+    results = payload["results"]
+    if args.fuzzy and results:
+        from . import normalize
+        normalize.learn(results)
+    elif not results and not args.json:
+        from . import normalize
+        suggestions = normalize.load_index().resolve(original_query).suggestions
+        if suggestions:
+            print("Did you mean: " + ", ".join(dict.fromkeys(suggestions)) + "?", file=sys.stderr)
+    if args.stream:
+        return 0
     if args.json:
-        print(json.dumps(payload, indent=2, ensure_ascii=False))
+        from .records import dumps
+        print(dumps(payload, indent=not args.compact, nulls=not args.compact))
     else:
         print_human(results, query, country)
     return 0
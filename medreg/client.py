@@ -0,0 +1,119 @@
+from __future__ import annotations
+import json
+import os
+import socket
+import sys
+from pathlib import Path
+from typing import Optional, Union
+from urllib.parse import urlencode
+
+from .adapters import SearchError
+from .utils.cache import default_dir
+
+# Client side of `medreg serve`, used by the CLI on every search. Kept apart from
+# serve.py so that forwarding a query does not import the HTTP server stack; when no
+# daemon is listening the connect fails before http.client is even loaded.
+#
+# The daemon listens on a Unix socket in the cache directory, readable by its owner
+# only, so another local user cannot pose as it and hand out forged results (or
+# document URLs for fetch-docs). TCP is opt-in: MEDREG_DAEMON=host:port here and
+# `medreg serve --port` on the other side.
+
+SOCKET_NAME = "daemon.sock"
+CONNECT_TIMEOUT = 0.2
+SERVER_HEADER = "X-Medreg-Daemon"
+# A search takes a few rounds of `timeout` (listing, more pages, enrichment, browser
+# steps); a daemon that has not answered by then plus a margin is taken as wedged.
+SEARCH_TIMEOUTS = 4
+RESPONSE_MARGIN = 5.0
+
+Address = Union[str, tuple[str, int]]
+
+def socket_path() -> Path:
+    return default_dir() / SOCKET_NAME
+
+def daemon_address() -> Optional[Address]:
+    """
+    MEDREG_DAEMON (a socket path, or host:port) when set, else the Unix socket in
+    the cache directory; None where the platform has no Unix sockets and no TCP
+    address was given.
+    """
+    addr = os.environ.get("MEDREG_DAEMON")
+    if addr and os.sep in addr:
+        return addr
+    if addr:
+        host, _, port = addr.rpartition(":")
+        return host or "127.0.0.1", int(port)
+    if not hasattr(socket, "AF_UNIX"):
+        return None
+    return str(socket_path())
+
+def describe(address: Address) -> str:
+    return address if isinstance(address, str) else f"{address[0]}:{address[1]}"
+
+def _owned_socket(path: str) -> bool:
+    # A socket someone else created (a shared MEDREG_CACHE_DIR) is not our daemon
+    try:
+        st = os.stat(path)
+    except OSError:
+        return False
+    return not hasattr(os, "getuid") or st.st_uid == os.getuid()
+
+def connect(address: Address, timeout: float) -> socket.socket:
+    if isinstance(address, str):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.settimeout(timeout)
+            sock.connect(address)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+    return socket.create_connection(address, timeout=timeout)
+
+def forward(*, country: str, query: str, timeout: float, browser: bool, lang: Optional[str], limit: int,
+            offline: bool = False, deadline: Optional[float] = None) -> Optional[dict]:
+    """
+    Run a search through a running daemon. Returns the payload, or None when no
+    daemon answers in time (the caller then searches in-process). Registry errors
+    reported by the daemon are raised as SearchError.
+    """
+    address = daemon_address()
+    if address is None or (isinstance(address, str) and not _owned_socket(address)):
+        return None
+    try:
+        sock = connect(address, CONNECT_TIMEOUT)
+    except OSError:
+        return None
+    import http.client
+    conn = http.client.HTTPConnection("localhost")
+    conn.sock = sock
+    wait = (deadline if deadline is not None else timeout * SEARCH_TIMEOUTS) + RESPONSE_MARGIN
+    try:
+        sock.settimeout(wait)
+        params = {"country": country, "query": query, "timeout": timeout, "limit": limit,
+                  "browser": "1" if browser else "0"}
+        if lang:
+            params["lang"] = lang
+        if offline:
+            params["offline"] = "1"
+        if deadline is not None:
+            params["deadline"] = deadline
+        conn.request("GET", "/search?" + urlencode(params))
+        resp = conn.getresponse()
+        if resp.getheader(SERVER_HEADER) != "1":
+            return None
+        body = json.loads(resp.read().decode("utf-8"))
+    except socket.timeout:
+        print(f"medreg: daemon at {describe(address)} did not answer within {wait:g} s; searching in-process",
+              file=sys.stderr)
+        return None
+    except (OSError, ValueError):
+        return None
+    finally:
+        conn.close()
+    if resp.status == 422:
+        raise SearchError(body.get("error") or "search failed")
+    if resp.status != 200:
+        return None
+    return body
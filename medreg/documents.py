@@ -0,0 +1,310 @@
+from __future__ import annotations
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional
+
+from .adapters import SearchError
+
+# `medreg fetch-docs`: download the SmPC/PIL documents behind search results.
+# Bodies are streamed to disk in chunks and hashed on the way; finished files are
+# stored once per content hash (objects/ab/abcd....pdf), so a leaflet shared by
+# several products or registries is kept once. Interrupted downloads stay in
+# partial/ and are resumed with Range/If-Range. manifest.json maps each product
+# to its files and each URL to the content it returned.
+
+CHUNK_SIZE = 64 * 1024
+DEFAULT_CONCURRENCY = 4
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+DOC_FIELDS = {"spc": "spc_url", "pil": "pil_url"}
+EXTENSIONS = {"application/pdf": ".pdf", "text/html": ".html", "application/xhtml+xml": ".html",
+              "application/msword": ".doc", "text/plain": ".txt"}
+
+class Manifest:
+    def __init__(self, root: Path):
+        self.path = root / MANIFEST_NAME
+        self.files: dict[str, dict] = {}
+        self.urls: dict[str, str] = {}
+        self.products: dict[str, dict] = {}
+        self._lock = threading.Lock()
+        if self.path.exists():
+            with open(self.path, encoding="utf-8") as f:
+                state = json.load(f)
+            self.files = state.get("files", {})
+            self.urls = state.get("urls", {})
+            self.products = state.get("products", {})
+
+    def known(self, url: str, root: Path) -> Optional[str]:
+        """Content hash of an already downloaded URL whose file is still on disk."""
+        with self._lock:
+            digest = self.urls.get(url)
+            entry = self.files.get(digest) if digest else None
+        if entry and (root / entry["path"]).exists():
+            return digest
+        return None
+
+    def add_file(self, url: str, digest: str, path: str, size: int, content_type: str) -> None:
+        with self._lock:
+            self.files[digest] = {"path": path, "bytes": size, "content_type": content_type}
+            self.urls[url] = digest
+
+    def add_product(self, key: str, entry: dict) -> None:
+        with self._lock:
+            self.products[key] = entry
+
+    def save(self) -> None:
+        with self._lock:
+            state = {"version": MANIFEST_VERSION, "files": self.files, "urls": self.urls, "products": self.products}
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_name(self.path.name + ".tmp")
+            tmp.write_text(json.dumps(state, ensure_ascii=False, indent=1, sort_keys=True), encoding="utf-8")
+            os.replace(tmp, self.path)
+
+def product_key(result: dict, country: Optional[str] = None) -> str:
+    country = result.get("country") or country or ""
+    return f"{country}:{result.get('detail_url') or result.get('product_name') or ''}"
+
+def _partial_paths(root: Path, url: str) -> tuple[Path, Path]:
+    name = hashlib.sha1(url.encode("utf-8")).hexdigest()
+    return root / "partial" / (name + ".part"), root / "partial" / (name + ".json")
+
+def _range_start(content_range: Optional[str]) -> Optional[int]:
+    # "bytes 1000-1999/5000" -> 1000
+    unit, _, spec = (content_range or "").strip().partition(" ")
+    first = spec.split("-", 1)[0]
+    if unit.lower() != "bytes" or not first.isdigit():
+        return None
+    return int(first)
+
+def _extension(content_type: str) -> str:
+    return EXTENSIONS.get(content_type.split(";")[0].strip().lower(), ".bin")
+
+def download(url: str, root: Path, *, timeout: float) -> tuple[str, str, int, str, bool]:
+    """
+    Stream one document into the content store. Returns (sha256, relative path,
+    size, content type, resumed).
+    """
+    from .adapters.base import default_headers
+    from .utils import trace
+    from .utils.http import get_session
+
+    part, meta_path = _partial_paths(root, url)
+    part.parent.mkdir(parents=True, exist_ok=True)
+    headers = default_headers()
+    headers["Accept"] = "application/pdf,text/html;q=0.9,*/*;q=0.8"
+    offset = part.stat().st_size if part.exists() else 0
+    meta = {}
+    if offset:
+        try:
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            meta = {}
+        validator = meta.get("etag") or meta.get("last_modified")
+        if validator:
+            # If-Range: the server sends the rest only if the document is unchanged, else all of it
+            headers["Range"] = f"bytes={offset}-"
+            headers["If-Range"] = validator
+        else:
+            offset = 0
+
+    with trace.span("http.download", url=url) as sp:
+        resp = get_session().get(url, headers=headers, timeout=timeout, stream=True, allow_redirects=True)
+        if offset and (resp.status_code == 416 or (
+                resp.status_code == 206 and _range_start(resp.headers.get("Content-Range")) != offset)):
+            # The partial file does not fit the document any more, or the server sent a
+            # different range than asked for; start over.
+            resp.close()
+            part.unlink()
+            return download(url, root, timeout=timeout)
+        if resp.status_code == 206 and not offset:
+            resp.close()
+            raise SearchError(f"fetch-docs: unexpected partial response for {url}: {resp.headers.get('Content-Range')}")
+        try:
+            resp.raise_for_status()
+            resumed = resp.status_code == 206 and offset > 0
+            if not resumed:
+                offset = 0
+            meta = {"etag": resp.headers.get("ETag"), "last_modified": resp.headers.get("Last-Modified"),
+                    "content_type": resp.headers.get("Content-Type") or meta.get("content_type") or ""}
+            meta_path.write_text(json.dumps(meta), encoding="utf-8")
+
+            digest = hashlib.sha256()
+            if resumed:
+                with open(part, "rb") as f:
+                    for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                        digest.update(chunk)
+            with open(part, "ab" if resumed else "wb") as f:
+                for chunk in resp.iter_content(CHUNK_SIZE):
+                    if chunk:
+                        f.write(chunk)
+                        digest.update(chunk)
+        finally:
+            resp.close()
+        size = part.stat().st_size
+        sp.set(status=resp.status_code, bytes=size - offset, resumed=resumed)
+
+    sha = digest.hexdigest()
+    content_type = meta["content_type"]
+    rel = Path("objects") / sha[:2] / (sha + _extension(content_type))
+    dest = root / rel
+    if dest.exists():
+        part.unlink()
+    else:
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(part, dest)
+    try:
+        meta_path.unlink()
+    except OSError:
+        pass
+    return sha, rel.as_posix(), size, content_type, resumed
+
+def fetch_documents(results: Iterable[dict], dest: Path, *, timeout: float = 15.0,
+                    concurrency: int = DEFAULT_CONCURRENCY, kinds: Iterable[str] = ("spc", "pil"),
+                    country: Optional[str] = None) -> dict:
+    """
+    Download the documents of `results` (adapter result dicts) into `dest` and
+    record them in its manifest. Returns counts plus a list of failures.
+    """
+    from .adapters import base
+
+    dest = Path(dest)
+    manifest = Manifest(dest)
+    fields = [DOC_FIELDS[k] for k in kinds]
+    products = []
+    urls: dict[str, None] = {}
+    for r in results:
+        products.append(r)
+        for field in fields:
+            if r.get(field):
+                urls[r[field]] = None
+
+    summary = {"products": len(products), "documents": len(urls), "downloaded": 0, "reused": 0, "resumed": 0,
+               "bytes": 0, "failed": []}
+    todo = [u for u in urls if manifest.known(u, dest) is None]
+    summary["reused"] = len(urls) - len(todo)
+    lock = threading.Lock()
+
+    def fetch(url: str):
+        try:
+            return download(url, dest, timeout=timeout)
+        except Exception as e:
+            with lock:
+                summary["failed"].append({"url": url, "error": str(e)})
+            raise
+
+    try:
+        for i, (sha, rel, size, content_type, resumed) in base.iter_bounded(
+                fetch, todo, url_of=lambda u: u, max_workers=concurrency):
+            manifest.add_file(todo[i], sha, rel, size, content_type)
+            summary["downloaded"] += 1
+            summary["resumed"] += resumed
+            summary["bytes"] += size
+    finally:
+        for r in products:
+            entry = {k: r.get(k) for k in ("country", "product_name", "detail_url") if r.get(k)}
+            entry.setdefault("country", country)
+            for kind, field in DOC_FIELDS.items():
+                url = r.get(field)
+                if url:
+                    entry[field] = url
+                    digest = manifest.urls.get(url)
+                    if digest:
+                        entry[kind] = manifest.files[digest]["path"]
+            manifest.add_product(product_key(r, country), entry)
+        manifest.save()
+    return summary
+
+def read_results(lines: Iterable[str]) -> Iterator[dict]:
+    """
+    Results from saved medreg output: the CLI's --json payload, `medreg batch`
+    JSONL records, --stream --json events, or one result object per line.
+    """
+    text = "".join(lines)
+    try:
+        doc = json.loads(text)
+    except ValueError:
+        doc = None
+    if isinstance(doc, dict) and isinstance(doc.get("results"), list):
+        for r in doc["results"]:
+            yield dict(r, country=r.get("country") or doc.get("country"))
+        return
+    streamed: list[dict] = []
+    for n, line in enumerate(text.splitlines(), 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            raise SearchError(f"fetch-docs: line {n} is not valid JSON: {e}")
+        if "event" in row:
+            fields = {k: v for k, v in row.items() if k not in ("event", "index")}
+            if row["event"] == "result":
+                streamed.append(fields)
+            else:
+                streamed[row["index"]].update(fields)
+        elif "result" in row:
+            if row["result"]:
+                yield dict(row["result"], country=row.get("country"))
+        else:
+            yield row
+    yield from streamed
+
+def build_argparser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(prog="medreg fetch-docs",
+                                description="Download SmPC/PIL documents for search results into a content-addressed store.")
+    p.add_argument("query", nargs="*", help="Search first and download the documents of its results")
+    p.add_argument("-c", "--country", help="Registry to search (with a query), e.g. fr or pl")
+    p.add_argument("-i", "--input", help="Saved results instead of a query: --json output, batch JSONL or stream JSONL ('-' for stdin)")
+    p.add_argument("-o", "--output", default="medreg-docs", help="Destination directory (default: ./medreg-docs)")
+    p.add_argument("--kind", action="append", choices=sorted(DOC_FIELDS), help="Only these document kinds (default: all)")
+    p.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help=f"Parallel downloads (default: {DEFAULT_CONCURRENCY})")
+    p.add_argument("--timeout", type=float, default=15.0, help="Per-request timeout seconds (default: 15)")
+    p.add_argument("--limit", type=int, default=15, help="Max search results (with a query; default: 15)")
+    p.add_argument("--browser", action="store_true", help="Allow headless browser for JS-heavy registries")
+    return p
+
+def main(argv: List[str]) -> int:
+    from .cli import parse_country
+    country_dash, rest = parse_country(argv)
+    args = build_argparser().parse_args(rest)
+    country = (args.country or country_dash or "").lower() or None
+
+    try:
+        if args.input:
+            src = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+            try:
+                results = list(read_results(src))
+            finally:
+                if src is not sys.stdin:
+                    src.close()
+        elif args.query:
+            if not country:
+                print("Error: pass a country with a query, e.g. -fr or --country fr", file=sys.stderr)
+                return 2
+            from .adapters import get_adapter
+            results = get_adapter(country).search(query=" ".join(args.query), timeout=args.timeout,
+                                                  browser=args.browser, lang=None, limit=args.limit)
+        else:
+            print("Error: pass a query or --input FILE", file=sys.stderr)
+            return 2
+        summary = fetch_documents(results, Path(args.output), timeout=args.timeout, concurrency=max(1, args.concurrency),
+                                  kinds=args.kind or DOC_FIELDS, country=country)
+    except SearchError as e:
+        print(f"fetch-docs failed: {e}", file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        print("Interrupted; re-run the same command to resume partial downloads.", file=sys.stderr)
+        return 130
+
+    print(f"{summary['downloaded']} downloaded ({summary['resumed']} resumed, {summary['bytes']} bytes), "
+          f"{summary['reused']} already present, {len(summary['failed'])} failed; "
+          f"manifest: {Path(args.output) / MANIFEST_NAME}", file=sys.stderr)
+    for f in summary["failed"]:
+        print(f"  {f['url']}: {f['error']}", file=sys.stderr)
+    return 1 if summary["failed"] else 0
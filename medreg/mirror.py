@@ -0,0 +1,188 @@
+from __future__ import annotations
+import argparse
+import json
+import os
+import sys
+import threading
+from bisect import bisect_left
+from heapq import nsmallest
+from pathlib import Path
+from typing import List, Optional
+from urllib.parse import urljoin
+
+from .adapters import SearchError
+from .records import Result
+from .utils.cache import default_dir
+from .utils.text import words
+
+# Offline mirror of the French BDPM built from its bulk download files.
+# `medreg mirror fr` downloads CIS_bdpm.txt (one row per product) and
+# CIS_COMPO_bdpm.txt (composition) and writes a compact JSON index: product
+# records plus a sorted word list with postings, so prefix lookups are a bisect.
+
+FR_BASE = "https://base-donnees-publique.medicaments.gouv.fr/"
+FR_DOWNLOAD = FR_BASE + "telechargement.php?fichier={name}"
+FR_FILES = ("CIS_bdpm.txt", "CIS_COMPO_bdpm.txt")
+FORMAT_VERSION = 1
+
+# Record layout (lists keep the index compact)
+F_CIS, F_NAME, F_FORM, F_INN, F_STRENGTH, F_MAH = range(6)
+
+def mirror_path(country: str, root: Optional[Path] = None) -> Path:
+    return (root or default_dir()) / "mirror" / f"{country}.json"
+
+def _decode(raw: bytes) -> str:
+    # The BDPM files have historically been Latin-1; newer exports are UTF-8.
+    try:
+        return raw.decode("utf-8")
+    except UnicodeDecodeError:
+        return raw.decode("cp1252", errors="replace")
+
+def _rows(text: str):
+    for line in text.splitlines():
+        if line.strip():
+            yield [c.strip() for c in line.split("\t")]
+
+def parse_fr(cis_text: str, compo_text: str) -> list[list]:
+    substances: dict[str, list[str]] = {}
+    strengths: dict[str, list[str]] = {}
+    for row in _rows(compo_text):
+        if len(row) < 7 or row[6] != "SA":
+            continue
+        cis, name, dosage = row[0], row[3], row[4]
+        if name and name not in substances.setdefault(cis, []):
+            substances[cis].append(name)
+        if dosage and dosage not in strengths.setdefault(cis, []):
+            strengths[cis].append(dosage)
+
+    records = []
+    for row in _rows(cis_text):
+        if len(row) < 11:
+            continue
+        cis = row[0]
+        records.append([
+            cis,
+            row[1],
+            row[2] or None,
+            ", ".join(substances.get(cis, [])) or None,
+            ", ".join(strengths.get(cis, [])) or None,
+            row[10] or None,
+        ])
+    records.sort(key=lambda r: r[F_NAME].lower())
+    return records
+
+def build_index(records: list[list]) -> dict:
+    postings: dict[str, set[int]] = {}
+    for i, rec in enumerate(records):
+        for w in words(f"{rec[F_NAME]} {rec[F_INN] or ''}"):
+            postings.setdefault(w, set()).add(i)
+    vocab = sorted(postings)
+    return {
+        "version": FORMAT_VERSION,
+        "records": records,
+        "words": vocab,
+        "postings": [sorted(postings[w]) for w in vocab],
+    }
+
+def build_fr(*, timeout: float, dest: Optional[Path] = None) -> Path:
+    from .adapters import base
+    texts = []
+    for name in FR_FILES:
+        try:
+            resp = base.simple_get(FR_DOWNLOAD.format(name=name), timeout=timeout)
+        except Exception as e:
+            raise SearchError(f"FR mirror: download of {name} failed: {e}")
+        texts.append(_decode(resp.content))
+    records = parse_fr(*texts)
+    if not records:
+        raise SearchError("FR mirror: downloaded files contained no products")
+    index = build_index(records)
+    dest = dest or mirror_path("fr")
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dest.with_name(dest.name + ".tmp")
+    tmp.write_text(json.dumps(index, ensure_ascii=False, separators=(",", ":")), encoding="utf-8")
+    os.replace(tmp, dest)
+    return dest
+
+class FrMirror:
+    def __init__(self, index: dict):
+        self.records = index["records"]
+        self.words = index["words"]
+        self.postings = index["postings"]
+
+    @classmethod
+    def load(cls, path: Path) -> "FrMirror":
+        index = json.loads(path.read_text(encoding="utf-8"))
+        if index.get("version") != FORMAT_VERSION:
+            raise SearchError("FR mirror: index format is outdated; re-run 'medreg mirror fr'")
+        return cls(index)
+
+    def _prefix(self, prefix: str) -> set[int]:
+        hits: set[int] = set()
+        i = bisect_left(self.words, prefix)
+        while i < len(self.words) and self.words[i].startswith(prefix):
+            hits.update(self.postings[i])
+            i += 1
+        return hits
+
+    def search(self, query: str, limit: int) -> list[Result]:
+        """Every query word must prefix-match a word of the name or substances (accent-insensitive)."""
+        terms = words(query)
+        if not terms:
+            return []
+        hits: Optional[set[int]] = None
+        for term in sorted(terms, key=len, reverse=True):
+            found = self._prefix(term)
+            hits = found if hits is None else hits & found
+            if not hits:
+                return []
+        # Records are stored sorted by name, so index order is alphabetical order.
+        return [self._result(self.records[i]) for i in nsmallest(limit, hits)]
+
+    @staticmethod
+    def _result(rec: list) -> Result:
+        cis = rec[F_CIS]
+        return Result(
+            product_name=rec[F_NAME],
+            inn=rec[F_INN] or None,
+            form=rec[F_FORM] or None,
+            strength=rec[F_STRENGTH] or None,
+            mah=rec[F_MAH] or None,
+            detail_url=urljoin(FR_BASE, f"extrait.php?specid={cis}"),
+            spc_url=urljoin(FR_BASE, f"affichageDoc.php?specid={cis}&typedoc=R"),
+            pil_url=urljoin(FR_BASE, f"affichageDoc.php?specid={cis}&typedoc=N"),
+        )
+
+_loaded: dict[Path, FrMirror] = {}
+_loaded_lock = threading.Lock()
+
+def load_fr(path: Optional[Path] = None) -> FrMirror:
+    """Load (once per process) the FR mirror index."""
+    path = path or mirror_path("fr")
+    with _loaded_lock:
+        mirror = _loaded.get(path)
+        if mirror is None:
+            if not path.exists():
+                raise SearchError("FR: no offline mirror found. Build it first with: medreg mirror fr")
+            mirror = _loaded[path] = FrMirror.load(path)
+        return mirror
+
+def build_argparser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(prog="medreg mirror", description="Download a registry's bulk files into a local search index.")
+    p.add_argument("country", help="Registry to mirror (supported: fr)")
+    p.add_argument("--timeout", type=float, default=120.0, help="Download timeout seconds (default: 120)")
+    return p
+
+def main(argv: List[str]) -> int:
+    args = build_argparser().parse_args(argv)
+    country = args.country.lower().lstrip("-")
+    if country != "fr":
+        print(f"Error: no bulk mirror available for '{args.country}'. Supported: fr", file=sys.stderr)
+        return 2
+    try:
+        path = build_fr(timeout=args.timeout)
+    except SearchError as e:
+        print(f"Mirror failed: {e}", file=sys.stderr)
+        return 1
+    print(f"FR mirror written to {path} ({len(load_fr(path).records)} products)", file=sys.stderr)
+    return 0
@@ -0,0 +1,210 @@
+from __future__ import annotations
+import re
+import threading
+from pathlib import Path
+from typing import Iterable, NamedTuple, Optional
+
+from .utils.cache import default_dir
+from .utils.text import fold, words
+
+# Query normalization in front of the adapters: strips salt/hydrate parts of an
+# INN in the registry languages and Latin ("Tramadolhydrochlorid", "tramadolu
+# chlorowodorek", "Tramadoli hydrochloridum", "chlorhydrate de tramadol" ->
+# "tramadol") and corrects misspelled words against a trigram index of INNs and
+# brand names seen in past results and local mirrors.
+
+VOCAB_NAME = "vocab.txt"
+MIN_SCORE = 0.55
+MIN_WORD = 4
+
+# Separate salt/hydrate words, all languages (folded, so no diacritics)
+SALT_WORDS = frozenset("""
+    hydrochloride hydrochlorid chlorhydrate chlorowodorek hcl hydrobromide bromhydrate bromowodorek
+    sodium natrium sodique sodowa sodowy sol potassium kalium potassique potasowa potasowy calcium calcique wapniowa
+    magnesium magnesique magnezowa sulfate sulfat siarczan phosphate phosphat fosforan maleate maleat maleinian
+    mesylate mesilate mesilat mezylan besylate besilate besilat bezylan citrate citrat cytrynian tartrate tartrat
+    winian fumarate fumarat fumaran succinate succinat bursztynian acetate acetat octan monohydrate monohydrat
+    dihydrate dihydrat trihydrate trihydrat anhydre anhydrous bezwodny jednowodny dwuwodny monohydrate hydrate
+    hydrochloridum hydrobromidum bromidum chloridum natricum dinatricum kalicum calcicum magnesicum besilas mesilas
+    maleas sulfas phosphas citras tartras fumaras succinas acetas monohydricum dihydricum trihydricum hemihydricum
+    anhydricum
+""".split())
+# Joining words ("chlorhydrate de tramadol"), dropped like salts
+LINK_WORDS = frozenset({"de", "d", "of"})
+
+# Salts written as one word with the base (German style): longest first
+GLUED_SUFFIXES = tuple(sorted((
+    "hydrochlorid", "hydrobromid", "natrium", "kalium", "calcium", "sulfat", "phosphat", "maleat", "mesilat",
+    "besilat", "citrat", "tartrat", "fumarat", "succinat", "acetat", "monohydrat", "dihydrat", "trihydrat",
+), key=len, reverse=True))
+
+# Next to a salt, Latin and Polish put the INN in the genitive ("tramadoli
+# hydrochloridum", "rocuronii bromidum", "tramadolu chlorowodorek"): ending -> base
+GENITIVE_ENDINGS = (("ii", "ium"), ("i", ""), ("u", ""))
+# Latin nominative -um ("paracetamolum", "diclofenacum"); -ium is kept ("rocuronium")
+_LATIN_NOMINATIVE = re.compile(r"(?<=[^aeiou])um$")
+MIN_STEM = 5
+
+class Resolution(NamedTuple):
+    query: str
+    changed: bool
+    suggestions: list[str]
+
+def _grams(word: str) -> set[str]:
+    padded = f"^{word}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def strip_salts(query: str) -> str:
+    """
+    Folded query with salt/hydrate words and glued German salt suffixes removed,
+    and Latin/Polish case endings taken off the INN.
+    """
+    ws = words(query)
+    salted = any(w in SALT_WORDS for w in ws)
+    out = []
+    for w in ws:
+        if w in SALT_WORDS or w in LINK_WORDS:
+            continue
+        for suffix in GLUED_SUFFIXES:
+            if w.endswith(suffix) and len(w) - len(suffix) >= MIN_WORD:
+                w = w[: -len(suffix)]
+                break
+        if w.isalpha():
+            w = _base_form(w, salted)
+        out.append(w)
+    return " ".join(out) or fold(query).strip()
+
+def _base_form(word: str, salted: bool) -> str:
+    if salted:
+        for ending, base in GENITIVE_ENDINGS:
+            if word.endswith(ending) and len(word) - len(ending) >= MIN_STEM:
+                return word[: -len(ending)] + base
+    if len(word) - 2 >= MIN_STEM and _LATIN_NOMINATIVE.search(word):
+        return word[:-2]
+    return word
+
+class InnIndex:
+    """Trigram index over known INN and brand words."""
+
+    def __init__(self, terms: Iterable[str] = ()):
+        self.terms: list[str] = []
+        self._ids: dict[str, int] = {}
+        self._grams: dict[str, list[int]] = {}
+        for t in terms:
+            self.add(t)
+
+    def __contains__(self, term: str) -> bool:
+        return term in self._ids
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    def add(self, term: str) -> bool:
+        if len(term) < MIN_WORD or term in self._ids:
+            return False
+        i = self._ids[term] = len(self.terms)
+        self.terms.append(term)
+        for g in _grams(term):
+            self._grams.setdefault(g, []).append(i)
+        return True
+
+    def suggest(self, word: str, n: int = 3, min_score: float = MIN_SCORE) -> list[str]:
+        grams = _grams(word)
+        counts: dict[int, int] = {}
+        for g in grams:
+            for i in self._grams.get(g, ()):
+                counts[i] = counts.get(i, 0) + 1
+        scored = []
+        for i, shared in counts.items():
+            term = self.terms[i]
+            # Dice coefficient over trigram sets (a word of length n has n padded trigrams)
+            score = 2.0 * shared / (len(grams) + len(term))
+            if score >= min_score:
+                scored.append((-score, abs(len(term) - len(word)), term))
+        scored.sort()
+        return [t for _, _, t in scored[:n]]
+
+    def resolve(self, query: str) -> Resolution:
+        base = strip_salts(query)
+        fixed = []
+        suggestions: list[str] = []
+        for w in base.split():
+            if len(w) < MIN_WORD or w.isdigit() or w in self or not self.terms:
+                fixed.append(w)
+                continue
+            best = self.suggest(w)
+            suggestions.extend(best)
+            fixed.append(best[0] if best else w)
+        resolved = " ".join(fixed)
+        return Resolution(resolved, resolved != fold(query).strip(), suggestions)
+
+def terms_from_results(results: Iterable[dict]) -> set[str]:
+    """INN words and brand names (first word of the product name) of results that have an INN."""
+    terms: set[str] = set()
+    for r in results:
+        # Results without an INN are often not products at all (navigation links, legal pages)
+        if not r.get("inn"):
+            continue
+        for inn in re.split(r"[,+/]", r["inn"]):
+            terms.update(w for w in strip_salts(inn).split() if w.isalpha())
+        name = words(r.get("product_name") or r.get("name") or "")
+        if name and name[0].isalpha():
+            terms.add(name[0])
+    return {t for t in terms if len(t) >= MIN_WORD}
+
+_index: Optional[InnIndex] = None
+_index_lock = threading.Lock()
+
+def vocab_path() -> Path:
+    return default_dir() / VOCAB_NAME
+
+def _read_vocab() -> list[str]:
+    try:
+        with open(vocab_path(), encoding="utf-8") as f:
+            return [line.strip() for line in f if line.strip()]
+    except OSError:
+        return []
+
+def load_index() -> InnIndex:
+    """Process-wide index from the learned vocabulary plus the FR mirror, if built."""
+    global _index
+    with _index_lock:
+        if _index is not None:
+            return _index
+        index = InnIndex(_read_vocab())
+        try:
+            from .mirror import F_INN, F_NAME, load_fr
+            mirror = load_fr()
+        except Exception:
+            mirror = None
+        if mirror is not None:
+            for rec in mirror.records:
+                for t in terms_from_results([{"product_name": rec[F_NAME], "inn": rec[F_INN]}]):
+                    index.add(t)
+        _index = index
+        return index
+
+def normalized(query: str) -> str:
+    """The query a --fuzzy search runs: salts stripped, misspellings corrected."""
+    resolution = load_index().resolve(query)
+    return resolution.query if resolution.changed and resolution.query else query
+
+def learn(results: Iterable[dict]) -> None:
+    """Add INN and brand words from results to the persistent vocabulary (--fuzzy searches only)."""
+    terms = terms_from_results(results)
+    if not terms:
+        return
+    index = load_index()
+    with _index_lock:
+        new = sorted(t for t in terms if t not in index)
+        if not new:
+            return
+        for t in new:
+            index.add(t)
+        try:
+            path = vocab_path()
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(path, "a", encoding="utf-8") as f:
+                f.write("".join(t + "\n" for t in new))
+        except OSError:
+            pass
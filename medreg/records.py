@@ -0,0 +1,184 @@
+from __future__ import annotations
+import json
+from collections.abc import MutableMapping
+from typing import Any, Iterator, Mapping, Optional
+
+try:
+    import orjson
+except ImportError:  # optional: faster encoding when installed
+    orjson = None
+
+# Search results share one fixed schema. Result keeps its fields in slots; unset
+# fields are None and, as for a dict without the key, raise KeyError on r["inn"]
+# and are left out of keys() and dict(r). Full JSON payloads (--json, the daemon)
+# still carry every schema field, unset ones as null, like the dicts adapters used
+# to return; compact output (--compact, batch, --stream) leaves them out. Keys
+# outside the schema still work and are kept separately.
+
+FIELDS = ("product_name", "inn", "form", "strength", "mah", "detail_url", "spc_url", "pil_url")
+_FIELD_SET = frozenset(FIELDS)
+# Older payloads used "name" for the product name
+_ALIASES = {"name": "product_name"}
+
+_encode_str = json.encoder.encode_basestring
+
+def _encode(value: Any) -> str:
+    if isinstance(value, str):
+        return _encode_str(value)
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=_default)
+
+class Result(MutableMapping):
+    __slots__ = FIELDS + ("_extra",)
+
+    def __init__(self, product_name: Optional[str] = None, inn: Optional[str] = None, form: Optional[str] = None,
+                 strength: Optional[str] = None, mah: Optional[str] = None, detail_url: Optional[str] = None,
+                 spc_url: Optional[str] = None, pil_url: Optional[str] = None, **extra: Any):
+        self.product_name = product_name
+        self.inn = inn
+        self.form = form
+        self.strength = strength
+        self.mah = mah
+        self.detail_url = detail_url
+        self.spc_url = spc_url
+        self.pil_url = pil_url
+        self._extra: Optional[dict] = None
+        for key, value in extra.items():
+            self[key] = value
+
+    @classmethod
+    def from_mapping(cls, data: Mapping) -> "Result":
+        if isinstance(data, Result):
+            return data.copy()
+        r = cls()
+        for key, value in data.items():
+            r[key] = value
+        return r
+
+    def copy(self) -> "Result":
+        r = Result.__new__(Result)
+        for name in FIELDS:
+            setattr(r, name, getattr(self, name))
+        r._extra = dict(self._extra) if self._extra else None
+        return r
+
+    # Mapping view: schema fields that are set, then extra keys
+
+    def __getitem__(self, key: str) -> Any:
+        key = _ALIASES.get(key, key)
+        if key in _FIELD_SET:
+            value = getattr(self, key)
+            if value is None:
+                raise KeyError(key)
+            return value
+        if self._extra and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        key = _ALIASES.get(key, key)
+        if key in _FIELD_SET:
+            setattr(self, key, value)
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def __delitem__(self, key: str) -> None:
+        key = _ALIASES.get(key, key)
+        if key in _FIELD_SET:
+            if getattr(self, key) is None:
+                raise KeyError(key)
+            setattr(self, key, None)
+        elif self._extra and key in self._extra:
+            del self._extra[key]
+        else:
+            raise KeyError(key)
+
+    def __contains__(self, key: object) -> bool:
+        key = _ALIASES.get(key, key)
+        if key in _FIELD_SET:
+            return getattr(self, key) is not None
+        return bool(self._extra) and key in self._extra
+
+    def __iter__(self) -> Iterator[str]:
+        for name in FIELDS:
+            if getattr(self, name) is not None:
+                yield name
+        if self._extra:
+            yield from self._extra
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self[key] if key in self else default
+
+    def __repr__(self) -> str:
+        return "Result(" + ", ".join(f"{k}={v!r}" for k, v in self.items()) + ")"
+
+    def as_dict(self, *, nulls: bool = False) -> dict:
+        """Set fields as a dict; with `nulls`, every schema field (unset ones as None)."""
+        if not nulls:
+            return dict(self.items())
+        out = {name: getattr(self, name) for name in FIELDS}
+        if self._extra:
+            out.update(self._extra)
+        return out
+
+    def to_json(self, *, nulls: bool = False) -> str:
+        """Compact JSON object, encoded straight from the slots."""
+        parts = []
+        for name in FIELDS:
+            value = getattr(self, name)
+            if value is not None:
+                parts.append(f'"{name}":{_encode(value)}')
+            elif nulls:
+                parts.append(f'"{name}":null')
+        if self._extra:
+            parts.extend(f"{_encode_str(str(k))}:{_encode(v)}" for k, v in self._extra.items())
+        return "{" + ",".join(parts) + "}"
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, Result):
+        return obj.as_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def _default_nulls(obj: Any) -> Any:
+    if isinstance(obj, Result):
+        return obj.as_dict(nulls=True)
+    return _default(obj)
+
+def merged_json(head: dict, record: Mapping) -> str:
+    """Compact JSON of {**head, **record} without building the merged dict."""
+    body = dumps(record if isinstance(record, Result) else dict(record))
+    start = dumps(head)[:-1]
+    if body == "{}":
+        return start + "}"
+    if start == "{":
+        return body
+    return start + "," + body[1:]
+
+def _leaf(obj: Any, default) -> str:
+    if orjson is not None:
+        return orjson.dumps(obj, default=default).decode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=default)
+
+def dumps(obj: Any, *, indent: bool = False, nulls: bool = False) -> str:
+    """
+    JSON text for payloads containing Results. Compact output splices each
+    Result's to_json() in without building dicts; other values, and indented
+    output, go through orjson when installed. `nulls` writes unset schema
+    fields of each Result as null.
+    """
+    default = _default_nulls if nulls else _default
+    if indent:
+        if orjson is not None:
+            return orjson.dumps(obj, default=default, option=orjson.OPT_INDENT_2).decode("utf-8")
+        return json.dumps(obj, ensure_ascii=False, indent=2, default=default)
+    if isinstance(obj, Result):
+        return obj.to_json(nulls=nulls)
+    if isinstance(obj, dict):
+        return "{" + ",".join(f"{_encode_str(str(k))}:{dumps(v, nulls=nulls)}" for k, v in obj.items()) + "}"
+    if isinstance(obj, (list, tuple)) and obj and isinstance(obj[0], Result):
+        return "[" + ",".join(dumps(v, nulls=nulls) for v in obj) + "]"
+    return _leaf(obj, default)
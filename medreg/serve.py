@@ -0,0 +1,252 @@
+from __future__ import annotations
+import argparse
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+from .adapters import get_adapter, SearchError
+from .client import CONNECT_TIMEOUT, SERVER_HEADER, Address, connect, describe, socket_path
+from .records import dumps
+
+# `medreg serve`: a long-lived local HTTP daemon answering the same search
+# contract as the CLI (the --json payload). Keeping the process alive keeps
+# imports, the pooled requests.Session (TLS keep-alive), warm Chromium browsers
+# and recent results around between lookups. The CLI forwards to it when it is up
+# (client.forward). It listens on an owner-only Unix socket in the cache
+# directory, or on TCP with --port.
+
+SOCKET_HELP = "daemon.sock under MEDREG_CACHE_DIR or ~/.cache/medreg"
+RESULT_TTL = 600.0
+RESULT_CACHE_SIZE = 512
+
+class _ResultCache:
+    def __init__(self, *, ttl: float, size: int):
+        self.ttl = ttl
+        self.size = size
+        self._items: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            hit = self._items.get(key)
+            if hit is None:
+                return None
+            stored_at, value = hit
+            if time.monotonic() - stored_at > self.ttl:
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return value
+
+    def put(self, key, value) -> None:
+        with self._lock:
+            self._items[key] = (time.monotonic(), value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+
+class MedregServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: Address, *, browser_workers: int = 2, verbose: bool = False):
+        if isinstance(address, str):
+            self.address_family = socket.AF_UNIX
+        self.verbose = verbose
+        self.results = _ResultCache(ttl=RESULT_TTL, size=RESULT_CACHE_SIZE)
+        # Playwright's sync API is bound to the thread that started it, so browser
+        # searches run on a fixed set of threads that each keep one browser warm.
+        self.browser_workers = browser_workers
+        self.browser_pool = ThreadPoolExecutor(max_workers=browser_workers, thread_name_prefix="medreg-browser")
+        self._socket_path: Optional[str] = None  # set once bound, removed on close
+        super().__init__(address, _Handler)
+
+    def prelaunch_browsers(self) -> None:
+        from .utils import browser as browser_utils
+        barrier = threading.Barrier(self.browser_workers)
+
+        def warm():
+            try:
+                browser_utils.prelaunch()
+            finally:
+                barrier.wait(timeout=60)
+
+        for _ in range(self.browser_workers):
+            self.browser_pool.submit(warm)
+
+    def search(self, *, country: str, query: str, timeout: float, browser: bool, lang: Optional[str], limit: int,
+               offline: bool = False, deadline: Optional[float] = None, fuzzy: bool = False) -> dict:
+        if fuzzy:
+            from . import normalize
+            query = normalize.normalized(query)
+        key = (country, query, browser, lang, limit, offline)
+        payload = self.results.get(key)
+        if payload is not None:
+            return payload
+        adapter = get_adapter(country)
+
+        def run():
+            return adapter.search(query=query, timeout=timeout, browser=browser, lang=lang, limit=limit, offline=offline,
+                                  deadline=deadline)
+
+        results = self.browser_pool.submit(run).result() if browser else run()
+        payload = {"country": country, "query": query, "results": results}
+        if fuzzy and results:
+            normalize.learn(results)
+        # Partial answers (deadline reached, sources down) are not kept for the next caller.
+        if not any(r.get("incomplete") for r in results):
+            self.results.put(key, payload)
+        return payload
+
+    def server_bind(self) -> None:
+        if self.address_family != socket.AF_UNIX:
+            super().server_bind()
+            return
+        path = self.server_address
+        _remove_stale_socket(path)
+        # Owner-only from the moment the socket exists
+        umask = os.umask(0o177)
+        try:
+            socketserver.TCPServer.server_bind(self)
+        finally:
+            os.umask(umask)
+        self._socket_path = path
+        os.chmod(path, 0o600)
+        self.server_name, self.server_port = "localhost", 0
+
+    def server_close(self) -> None:
+        from .utils import browser as browser_utils
+        for _ in range(self.browser_workers):
+            self.browser_pool.submit(browser_utils.close_thread_browser)
+        self.browser_pool.shutdown(wait=True)
+        super().server_close()
+        if self._socket_path:
+            try:
+                os.unlink(self._socket_path)
+            except OSError:
+                pass
+
+def _remove_stale_socket(path: str) -> None:
+    """Unlink a socket left by a daemon that died; refuse to take over a live one."""
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return
+    try:
+        connect(path, CONNECT_TIMEOUT).close()
+    except OSError:
+        os.unlink(path)
+        return
+    raise OSError(f"another daemon is listening on {path}")
+
+class _Handler(BaseHTTPRequestHandler):
+    server: MedregServer
+
+    def address_string(self) -> str:
+        # Unix socket peers have no address
+        return self.client_address[0] if isinstance(self.client_address, tuple) else "local"
+
+    def do_GET(self) -> None:
+        url = urlsplit(self.path)
+        if url.path == "/health":
+            self._send(200, {"status": "ok", "pid": os.getpid()})
+            return
+        if url.path != "/search":
+            self._send(404, {"error": "not found"})
+            return
+        qs = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        try:
+            payload = self.server.search(
+                country=(qs.get("country") or "").lower(),
+                query=qs.get("query", "").strip(),
+                timeout=float(qs.get("timeout", 15.0)),
+                browser=qs.get("browser") == "1",
+                lang=qs.get("lang") or None,
+                limit=int(qs.get("limit", 15)),
+                offline=qs.get("offline") == "1",
+                deadline=float(qs["deadline"]) if qs.get("deadline") else None,
+                fuzzy=qs.get("fuzzy") == "1",
+            )
+        except SearchError as e:
+            self._send(422, {"error": str(e)})
+            return
+        except ValueError as e:
+            self._send(400, {"error": str(e)})
+            return
+        except Exception as e:
+            self._send(500, {"error": f"{type(e).__name__}: {e}"})
+            return
+        self._send(200, payload)
+
+    def _send(self, status: int, body: dict) -> None:
+        data = dumps(body, nulls=True).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header(SERVER_HEADER, "1")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format: str, *args) -> None:
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+def build_argparser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(prog="medreg serve", description="Run a long-lived medreg search daemon on localhost.")
+    p.add_argument("--socket", help=f"Unix socket to listen on (default: {SOCKET_HELP})")
+    p.add_argument("--port", type=int,
+                   help="Listen on TCP instead; clients must set MEDREG_DAEMON=host:port (unauthenticated)")
+    p.add_argument("--host", default="127.0.0.1", help="TCP bind address with --port (default: 127.0.0.1)")
+    p.add_argument("--browser-workers", type=int, default=2, help="Warm headless browsers to keep (default: 2)")
+    p.add_argument("--no-prelaunch", action="store_true", help="Launch browsers on first use instead of at startup")
+    p.add_argument("--cache-dir", help="Enable the persistent HTTP cache in this directory")
+    p.add_argument("--no-cache", action="store_true", help="Disable the HTTP cache even if MEDREG_CACHE_DIR is set")
+    p.add_argument("--hedge", action="store_true", help="Re-send requests that are slower than the endpoint's usual p95")
+    p.add_argument("-v", "--verbose", action="store_true", help="Log every request to stderr")
+    return p
+
+def main(argv: List[str]) -> int:
+    args = build_argparser().parse_args(argv)
+    from .utils import browser as browser_utils
+    from .utils import cache as http_cache
+    from .utils import latency
+    from .utils.http import get_session
+
+    http_cache.configure(cache_dir=args.cache_dir, enabled=not args.no_cache)
+    latency.configure(hedge=args.hedge)
+    get_session()
+    browser_utils.keep_warm(True)
+    if args.port is not None:
+        address: Address = (args.host, args.port)
+    elif hasattr(socket, "AF_UNIX"):
+        address = args.socket or str(socket_path())
+    else:
+        print("Error: Unix sockets are not available here; pass --port and set MEDREG_DAEMON for clients",
+              file=sys.stderr)
+        return 2
+    try:
+        server = MedregServer(address, browser_workers=max(1, args.browser_workers), verbose=args.verbose)
+    except OSError as e:
+        print(f"Error: cannot listen on {describe(address)}: {e}", file=sys.stderr)
+        return 1
+    if not args.no_prelaunch:
+        try:
+            import playwright  # noqa: F401
+        except ImportError:
+            pass
+        else:
+            server.prelaunch_browsers()
+    print(f"medreg serve listening on {describe(address)}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
@@ -0,0 +1,223 @@
+from __future__ import annotations
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import IO, Iterable, List, Optional
+
+from .adapters import SearchError, get_adapter
+from .utils.cache import default_dir
+
+# `medreg sync`: keep a snapshot of the products behind a watch list of queries and
+# report what changed since the last run. Each query costs one search request; a
+# product's enrichment sources (FR detail page, PL product/documents API) are
+# revalidated with If-None-Match/If-Modified-Since and only re-parsed when the
+# body's hash changed, so a quiet night costs mostly 304s.
+
+SNAPSHOT_NAME = "sync-snapshot.json"
+SNAPSHOT_VERSION = 1
+SYNC_COUNTRIES = ("fr", "pl")
+# Fields compared between runs
+TRACKED_FIELDS = ("product_name", "inn", "form", "strength", "mah", "spc_url", "pil_url", "detail_url")
+
+def snapshot_path() -> Path:
+    return default_dir() / SNAPSHOT_NAME
+
+def product_key(country: str, result: dict) -> str:
+    return f"{country}:{result.get('detail_url') or result.get('product_name') or ''}"
+
+class Snapshot:
+    """
+    products: key -> {"country", "fields", "sources": {url: {"etag", "last_modified", "sha256", "fields"}}}
+    queries:  "country:query" -> product keys listed by the last search
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.products: dict[str, dict] = {}
+        self.queries: dict[str, list[str]] = {}
+        if path.exists():
+            with open(path, encoding="utf-8") as f:
+                state = json.load(f)
+            self.products = state.get("products", {})
+            self.queries = state.get("queries", {})
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        state = {"version": SNAPSHOT_VERSION, "synced_at": time.time(), "products": self.products, "queries": self.queries}
+        tmp.write_text(json.dumps(state, ensure_ascii=False, separators=(",", ":")), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+def _revalidate(adapter, core: dict, url: str, previous: Optional[dict], timeout: float) -> tuple[dict, str]:
+    """
+    Conditional GET of one enrichment source. Returns (source state, outcome) where
+    outcome is "not_modified" (304), "same" (200, identical body) or "changed".
+    """
+    from .adapters import base
+
+    headers = {}
+    if previous:
+        if previous.get("etag"):
+            headers["If-None-Match"] = previous["etag"]
+        if previous.get("last_modified"):
+            headers["If-Modified-Since"] = previous["last_modified"]
+    resp = base.simple_get(url, timeout=timeout, headers=headers)
+    if previous and resp.status_code == 304:
+        return previous, "not_modified"
+    digest = hashlib.sha256(resp.content).hexdigest()
+    state = {"etag": resp.headers.get("ETag"), "last_modified": resp.headers.get("Last-Modified"), "sha256": digest}
+    if previous and previous.get("sha256") == digest:
+        return dict(previous, **state), "same"
+    enriched = dict(core)
+    adapter.apply_source(enriched, url, resp)
+    state["fields"] = {k: v for k, v in enriched.items() if core.get(k) != v}
+    return state, "changed"
+
+def _tracked(fields: dict) -> dict:
+    return {k: fields.get(k) for k in TRACKED_FIELDS if fields.get(k) is not None}
+
+def sync_query(snapshot: Snapshot, country: str, query: str, *, timeout: float, limit: int,
+               browser: bool = False) -> tuple[list[dict], dict]:
+    """Re-run one watched query; updates the snapshot and returns (diff records, counters)."""
+    from .adapters import base
+
+    adapter = get_adapter(country)
+    if not hasattr(adapter, "list_results"):
+        raise SearchError(f"{country.upper()}: sync is not supported for this registry (supported: {', '.join(SYNC_COUNTRIES)})")
+    listed = adapter.list_results(query=query, timeout=timeout, limit=limit, browser=browser)
+    counts = {"products": len(listed), "sources": 0, "not_modified": 0, "same": 0, "changed": 0, "failed": 0}
+
+    jobs = []
+    for n, (core, sources) in enumerate(listed):
+        key = product_key(country, core)
+        previous = snapshot.products.get(key, {}).get("sources", {})
+        for url in sources:
+            jobs.append((n, core, url, previous.get(url)))
+    counts["sources"] = len(jobs)
+    states: dict[tuple[int, str], dict] = {}
+    for j, (state, outcome) in base.iter_bounded(
+            lambda job: _revalidate(adapter, job[1], job[2], job[3], timeout), jobs, url_of=lambda job: job[2]):
+        n, _, url, _ = jobs[j]
+        states[(n, url)] = state
+        counts[outcome] += 1
+    counts["failed"] = len(jobs) - len(states)
+
+    diff: list[dict] = []
+    keys = []
+    for n, (core, sources) in enumerate(listed):
+        key = product_key(country, core)
+        keys.append(key)
+        old = snapshot.products.get(key)
+        source_states = {}
+        fields = dict(core)
+        for url in sources:
+            # A source that could not be fetched keeps its last known state.
+            state = states.get((n, url)) or (old or {}).get("sources", {}).get(url)
+            if state is None:
+                continue
+            source_states[url] = state
+            fields.update(state.get("fields") or {})
+        fields = _tracked(fields)
+        if old is None:
+            diff.append({"change": "added", "country": country, "query": query, "key": key, "fields": fields})
+        else:
+            changes = {k: [old["fields"].get(k), fields.get(k)] for k in TRACKED_FIELDS
+                       if old["fields"].get(k) != fields.get(k)}
+            if changes:
+                diff.append({"change": "changed", "country": country, "query": query, "key": key, "changes": changes})
+        snapshot.products[key] = {"country": country, "fields": fields, "sources": source_states}
+
+    qkey = f"{country}:{query}"
+    for key in snapshot.queries.get(qkey, []):
+        if key not in keys:
+            old = snapshot.products.get(key, {})
+            diff.append({"change": "removed", "country": country, "query": query, "key": key,
+                         "fields": old.get("fields", {})})
+    snapshot.queries[qkey] = keys
+    _drop_unlisted(snapshot)
+    return diff, counts
+
+def _drop_unlisted(snapshot: Snapshot) -> None:
+    listed = {k for keys in snapshot.queries.values() for k in keys}
+    for key in [k for k in snapshot.products if k not in listed]:
+        del snapshot.products[key]
+
+def run_sync(watch: Iterable[tuple[str, str]], snapshot: Snapshot, out: IO[str], *, timeout: float, limit: int,
+             browser: bool = False) -> tuple[dict, int]:
+    totals = {"queries": 0, "products": 0, "sources": 0, "not_modified": 0, "same": 0, "changed": 0, "failed": 0,
+              "added": 0, "removed": 0, "modified": 0}
+    failures = 0
+    for country, query in watch:
+        totals["queries"] += 1
+        try:
+            diff, counts = sync_query(snapshot, country, query, timeout=timeout, limit=limit, browser=browser)
+        except SearchError as e:
+            failures += 1
+            print(f"sync: {country}:{query}: {e}", file=sys.stderr)
+            continue
+        for k, v in counts.items():
+            totals[k] += v
+        for record in diff:
+            totals["modified" if record["change"] == "changed" else record["change"]] += 1
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+        out.flush()
+    return totals, failures
+
+def build_argparser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(prog="medreg sync",
+                                description="Re-check watched queries and print added/removed/changed products as JSONL.")
+    p.add_argument("input", nargs="?",
+                   help="Watch list: one query per line or JSONL rows as for 'medreg batch' "
+                        "(default: the queries already in the snapshot)")
+    p.add_argument("-c", "--country", action="append", default=[],
+                   help="Country for plain-text rows; repeat or comma-separate (e.g. -c fr,pl)")
+    p.add_argument("-o", "--output", default="-", help="Diff output file (default: stdout)")
+    p.add_argument("--snapshot", help=f"Snapshot file (default: {SNAPSHOT_NAME} under MEDREG_CACHE_DIR or ~/.cache/medreg)")
+    p.add_argument("--no-save", action="store_true", help="Report changes without updating the snapshot")
+    p.add_argument("--browser", action="store_true", help="Allow the PL browser fallback")
+    p.add_argument("--timeout", type=float, default=15.0, help="Per-request timeout seconds (default: 15)")
+    p.add_argument("--limit", type=int, default=50, help="Max products tracked per query (default: 50)")
+    return p
+
+def main(argv: List[str]) -> int:
+    args = build_argparser().parse_args(argv)
+    snapshot = Snapshot(Path(args.snapshot).expanduser() if args.snapshot else snapshot_path())
+    countries = [c.strip().lower() for spec in args.country for c in spec.split(",") if c.strip()]
+
+    try:
+        if args.input:
+            from .batch import parse_rows
+            src = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+            try:
+                watch = [(c, q) for _, _, q, cs in parse_rows(src, countries) for c in dict.fromkeys(cs)]
+            finally:
+                if src is not sys.stdin:
+                    src.close()
+        else:
+            watch = [tuple(k.split(":", 1)) for k in snapshot.queries]
+    except SearchError as e:
+        print(f"Sync failed: {e}", file=sys.stderr)
+        return 2
+    if not watch:
+        print("Error: nothing to sync; pass a watch list (see --help)", file=sys.stderr)
+        return 2
+
+    out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    try:
+        totals, failures = run_sync(watch, snapshot, out, timeout=args.timeout, limit=args.limit, browser=args.browser)
+    except KeyboardInterrupt:
+        print("Interrupted; the snapshot was not updated.", file=sys.stderr)
+        return 130
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    if not args.no_save:
+        snapshot.save()
+    print(f"{totals['queries']} queries, {totals['products']} products: {totals['added']} added, "
+          f"{totals['removed']} removed, {totals['modified']} changed. Sources: {totals['not_modified']} not modified, "
+          f"{totals['same']} unchanged bodies, {totals['changed']} re-parsed, {totals['failed']} failed.", file=sys.stderr)
+    return 1 if failures else 0
@@ -0,0 +1,220 @@
+from __future__ import annotations
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+from urllib.parse import urlsplit
+
+from ..adapters import SearchError
+from . import trace
+from .selectors import ABSENT, SelectorMemory
+
+# Shared Playwright plumbing for the browser-based adapters.
+# By default every search launches and closes its own Chromium. When keep_warm()
+# is on (medreg serve), each thread keeps one browser alive and searches only pay
+# for a fresh, isolated browser context.
+
+_local = threading.local()
+_keep_warm = False
+
+# Resource types not needed to drive a search form or read its results
+BLOCKED_RESOURCE_TYPES = frozenset({"image", "font", "stylesheet", "media"})
+
+_EXTRACT_LINKS_JS = """
+(max) => Array.from(document.querySelectorAll('a')).slice(0, max).map(a => ({
+    href: a.getAttribute('href') || '',
+    text: (a.innerText || '').trim(),
+}))
+"""
+
+def keep_warm(enabled: bool = True) -> None:
+    global _keep_warm
+    _keep_warm = enabled
+
+def keep_warm_in_thread() -> None:
+    """keep_warm() for the calling thread only (e.g. as a ThreadPoolExecutor initializer)."""
+    _local.keep_warm = True
+
+def _start(missing_message: str):
+    try:
+        from playwright.sync_api import sync_playwright
+    except ImportError:
+        raise SearchError(missing_message)
+    with trace.span("browser.launch"):
+        pw = sync_playwright().start()
+        try:
+            return pw, pw.chromium.launch(headless=True)
+        except Exception:
+            pw.stop()
+            raise
+
+def _warm_browser(missing_message: str):
+    browser = getattr(_local, "browser", None)
+    if browser is not None and browser.is_connected():
+        return browser
+    close_thread_browser()
+    _local.pw, _local.browser = _start(missing_message)
+    return _local.browser
+
+def close_thread_browser() -> None:
+    """Shut down the warm browser owned by the calling thread, if any."""
+    browser = getattr(_local, "browser", None)
+    pw = getattr(_local, "pw", None)
+    _local.browser = _local.pw = None
+    try:
+        if browser is not None:
+            browser.close()
+    except Exception:
+        pass
+    if pw is not None:
+        try:
+            pw.stop()
+        except Exception:
+            pass
+
+def prelaunch(missing_message: str = "Playwright is not installed") -> None:
+    """Launch this thread's warm browser ahead of the first search."""
+    _warm_browser(missing_message)
+
+def block_heavy_resources(page) -> None:
+    def route(r):
+        if r.request.resource_type in BLOCKED_RESOURCE_TYPES:
+            r.abort()
+        else:
+            r.continue_()
+    page.route("**/*", route)
+
+@contextmanager
+def open_page(*, missing_message: str, block_resources: bool = True):
+    if _keep_warm or getattr(_local, "keep_warm", False):
+        browser = _warm_browser(missing_message)
+        with trace.span("browser.context"):
+            context = browser.new_context()
+        try:
+            page = context.new_page()
+            if block_resources:
+                block_heavy_resources(page)
+            yield page
+        finally:
+            try:
+                context.close()
+            except Exception:
+                pass
+        return
+
+    pw, browser = _start(missing_message)
+    try:
+        page = browser.new_page()
+        if block_resources:
+            block_heavy_resources(page)
+        yield page
+    finally:
+        try:
+            browser.close()
+        finally:
+            pw.stop()
+
+def extract_links(ctx, limit: int = 400) -> list[dict]:
+    """All anchors' href and visible text in one evaluate() round trip."""
+    with trace.span("browser.extract") as sp:
+        links = ctx.evaluate(_EXTRACT_LINKS_JS, limit)
+        sp.set(links=len(links))
+        return links
+
+def _probe(ctx, selectors: list[str], state: str):
+    for sel in selectors:
+        try:
+            handle = ctx.query_selector(sel)
+            if handle is not None and (state != "visible" or handle.is_visible()):
+                return sel, handle
+        except Exception:
+            continue
+    return None, None
+
+def _wait_any(ctx, selectors: list[str], timeout: float, state: str):
+    try:
+        ctx.wait_for_selector(", ".join(selectors), timeout=int(timeout * 1000), state=state)
+    except Exception:
+        return None, None
+    return _probe(ctx, selectors, state)
+
+def first_match(ctx, selectors: list[str], *, timeout: float, state: str = "visible",
+                memory: Optional[SelectorMemory] = None, slot: Optional[str] = None, optional: bool = False):
+    """
+    Wait once for whichever selector appears first instead of timing out on each
+    in turn. Returns (selector, element handle), or (None, None) on timeout.
+    `timeout` is in seconds.
+
+    With a SelectorMemory, the selector that worked last time for `slot` goes
+    first in that one wait (and is preferred when several match), so a stale
+    entry costs nothing extra; an `optional` element remembered as absent is only
+    probed for, not waited on.
+    """
+    with trace.span("browser.probe", slot=slot) as sp:
+        sel, handle = _first_match(ctx, selectors, timeout, state, memory, slot, optional)
+        sp.set(selector=sel)
+        return sel, handle
+
+def _first_match(ctx, selectors: list[str], timeout: float, state: str,
+                 memory: Optional[SelectorMemory], slot: Optional[str], optional: bool):
+    known = memory.get(slot) if memory is not None and slot else None
+    if known == ABSENT and optional:
+        sel, handle = _probe(ctx, selectors, state)
+        if handle is not None:
+            memory.remember(slot, sel)
+        return sel, handle
+    if known and known in selectors:
+        selectors = [known] + [s for s in selectors if s != known]
+
+    sel, handle = _wait_any(ctx, selectors, timeout, state)
+    if memory is not None and slot:
+        if handle is not None:
+            memory.remember(slot, sel)
+        elif optional:
+            memory.remember(slot, ABSENT)
+        elif known:
+            memory.forget(slot)
+    return sel, handle
+
+def click_first(ctx, selectors: list[str], *, timeout: float,
+                memory: Optional[SelectorMemory] = None, slot: Optional[str] = None, optional: bool = True):
+    """Click the first of `selectors` to appear; returns the selector used or None."""
+    sel, handle = first_match(ctx, selectors, timeout=timeout, memory=memory, slot=slot, optional=optional)
+    if handle is None:
+        return None
+    try:
+        handle.click(timeout=int(timeout * 1000))
+    except Exception:
+        if memory is not None and slot:
+            memory.forget(slot)
+        return None
+    return sel
+
+def url_pattern(url: str) -> str:
+    """Scheme, host and path of a frame URL, used to recognise the same frame later."""
+    parts = urlsplit(url or "")
+    return f"{parts.scheme}://{parts.netloc}{parts.path}" if parts.netloc else ""
+
+def settle(ctx, *, timeout: float) -> None:
+    """Wait for network idle (bounded by `timeout` seconds) rather than a fixed sleep."""
+    with trace.span("browser.settle"):
+        try:
+            ctx.wait_for_load_state("networkidle", timeout=int(timeout * 1000))
+        except Exception:
+            pass
+
+def wait_for_frame(page, predicate, *, timeout: float):
+    """Return the first frame matching predicate, waiting for navigations up to `timeout` seconds."""
+    deadline = time.monotonic() + timeout
+    with trace.span("browser.frame"):
+        while True:
+            for frame in page.frames:
+                if predicate(frame):
+                    return frame
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            try:
+                page.wait_for_event("framenavigated", timeout=int(remaining * 1000))
+            except Exception:
+                return None
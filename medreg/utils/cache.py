@@ -0,0 +1,181 @@
+from __future__ import annotations
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+# Opt-in persistent HTTP cache used by adapters.base.simple_get.
+# Enabled by configure(cache_dir=...) (CLI: --cache-dir) or the MEDREG_CACHE_DIR env var.
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DB_NAME = "http-cache.sqlite3"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    status INTEGER NOT NULL,
+    headers TEXT NOT NULL,
+    body BLOB NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    stored_at REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at);
+"""
+
+def default_dir() -> Path:
+    """Base directory for medreg's on-disk state (cache, mirrors, learned data)."""
+    env = os.environ.get("MEDREG_CACHE_DIR")
+    if env:
+        return Path(env).expanduser()
+    xdg = os.environ.get("XDG_CACHE_HOME")
+    return (Path(xdg).expanduser() if xdg else Path.home() / ".cache") / "medreg"
+
+def cache_key(method: str, url: str, params: Optional[dict] = None, body: Optional[bytes] = None) -> str:
+    import requests
+    full = requests.Request(method.upper(), url, params=params).prepare().url
+    key = f"{method.upper()} {full}"
+    if body:
+        import hashlib
+        key += " #" + hashlib.sha256(body).hexdigest()
+    return key
+
+class CachedEntry:
+    __slots__ = ("key", "url", "status", "headers", "body", "etag", "last_modified", "stored_at")
+
+    def __init__(self, key, url, status, headers, body, etag, last_modified, stored_at):
+        self.key = key
+        self.url = url
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.stored_at = stored_at
+
+    def is_fresh(self, ttl: float) -> bool:
+        return time.time() - self.stored_at < ttl
+
+    def validators(self) -> dict[str, str]:
+        hdrs = {}
+        if self.etag:
+            hdrs["If-None-Match"] = self.etag
+        if self.last_modified:
+            hdrs["If-Modified-Since"] = self.last_modified
+        return hdrs
+
+    def to_response(self):
+        import requests
+        from requests.structures import CaseInsensitiveDict
+        from requests.utils import get_encoding_from_headers
+        resp = requests.Response()
+        resp.status_code = self.status
+        resp.headers = CaseInsensitiveDict(self.headers)
+        resp._content = self.body
+        resp.url = self.url
+        resp.encoding = get_encoding_from_headers(resp.headers)
+        resp.from_cache = True
+        return resp
+
+class HttpCache:
+    """Single-file SQLite response store with LRU eviction by total body size."""
+
+    def __init__(self, path: Path, *, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        import sqlite3
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+
+    def get(self, key: str) -> Optional[CachedEntry]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT url, status, headers, body, etag, last_modified, stored_at FROM responses WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if row is None:
+                return None
+            self._db.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+        url, status, headers, body, etag, last_modified, stored_at = row
+        return CachedEntry(key, url, status, json.loads(headers), body, etag, last_modified, stored_at)
+
+    def put(self, key: str, resp) -> None:
+        cc = (resp.headers.get("Cache-Control") or "").lower()
+        if "no-store" in cc:
+            return
+        body = resp.content
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    key,
+                    resp.url,
+                    resp.status_code,
+                    json.dumps(dict(resp.headers)),
+                    body,
+                    resp.headers.get("ETag"),
+                    resp.headers.get("Last-Modified"),
+                    now,
+                    now,
+                    len(body),
+                ),
+            )
+            self._evict()
+            self._db.commit()
+
+    def revalidated(self, key: str) -> None:
+        """Mark an entry fresh again after a 304 Not Modified."""
+        now = time.time()
+        with self._lock:
+            self._db.execute("UPDATE responses SET stored_at = ?, accessed_at = ? WHERE key = ?", (now, now, key))
+            self._db.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM responses")
+            self._db.commit()
+
+    def _evict(self) -> None:
+        (total,) = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()
+        if total <= self.max_bytes:
+            return
+        for key, size in self._db.execute("SELECT key, size FROM responses ORDER BY accessed_at").fetchall():
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+_cache: Optional[HttpCache] = None
+_configured = False
+_refresh = False
+
+def configure(*, cache_dir: Optional[str] = None, enabled: bool = True, refresh: bool = False,
+              max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+    global _cache, _configured, _refresh
+    _configured = True
+    _refresh = refresh
+    _cache = None
+    if not enabled:
+        return
+    root = Path(cache_dir).expanduser() if cache_dir else (default_dir() if os.environ.get("MEDREG_CACHE_DIR") else None)
+    if root is not None:
+        _cache = HttpCache(root / DB_NAME, max_bytes=max_bytes)
+
+def get_cache() -> Optional[HttpCache]:
+    if not _configured:
+        configure()
+    return _cache
+
+def refresh_requested() -> bool:
+    return _refresh
@@ -1,12 +1,168 @@
 from __future__ import annotations
+import random
+import threading
+import time
+from typing import Optional
+from urllib.parse import urlsplit
+
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# One shared Session for all adapters and threads. Connection pools are kept per
+# host (urllib3 pools are thread-safe), transient failures are retried with
+# jittered exponential backoff that honours Retry-After, and each registry host
+# can be paced with a token bucket so concurrent callers stay polite.
+
+DEFAULT_POOL_SIZE = 10      # kept-alive connections per host
+MAX_HOST_POOLS = 16         # distinct hosts with a live pool
+MAX_RETRIES = 3
+BACKOFF_FACTOR = 0.5        # 0.5s, 1s, 2s ... before jitter
+BACKOFF_MAX = 8.0
+MAX_RETRY_AFTER = 30.0      # never sleep longer than this on a Retry-After header
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+# Registry searches are reads, so POST (PL search API) is retried as well
+RETRY_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "POST"})
+
+# Defaults for the registries we call without a browser: requests/second, burst
+# size and pool size. A single search fits in the burst (PL issues 1 + 2 per
+# result); sustained runs such as `medreg batch` are paced at `rate`.
+REGISTRY_LIMITS = {
+    "base-donnees-publique.medicaments.gouv.fr": {"rate": 10.0, "burst": 32, "pool": 16},
+    "rejestry.ezdrowie.gov.pl": {"rate": 10.0, "burst": 32, "pool": 16},
+}
+
+class _Retry(Retry):
+    def get_backoff_time(self) -> float:
+        base = super().get_backoff_time()
+        # Full jitter keeps parallel workers from retrying in lockstep
+        return random.uniform(0, min(base, BACKOFF_MAX)) if base else 0.0
+
+    def parse_retry_after(self, retry_after: str) -> float:
+        # urllib3 raises on anything but whole seconds or an HTTP date; a value of 0
+        # makes it fall back to the exponential backoff instead.
+        try:
+            seconds = float(retry_after)
+        except ValueError:
+            try:
+                seconds = super().parse_retry_after(retry_after)
+            except Exception:
+                return 0.0
+        return max(0.0, min(seconds, MAX_RETRY_AFTER))
+
+def retry_policy(total: int = MAX_RETRIES) -> Retry:
+    # Read errors are not retried: a stalled response already used up its timeout,
+    # and retrying it would multiply --timeout (and overrun a search's deadline).
+    return _Retry(
+        total=total,
+        connect=total,
+        read=0,
+        status=total,
+        backoff_factor=BACKOFF_FACTOR,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=RETRY_METHODS,
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+
+class TokenBucket:
+    """Allow `rate` requests/second with bursts of up to `burst`; acquire() blocks until a token is free."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
 
-_session = None
+    def acquire(self) -> float:
+        """Take one token; returns the seconds spent waiting."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            # A negative balance is a reservation: sleep until it would have refilled.
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+def _host(url: str) -> str:
+    parts = urlsplit(url if "//" in url else "//" + url)
+    return parts.netloc.lower()
+
+class _PacedAdapter(HTTPAdapter):
+    """HTTPAdapter that takes a token from the host's bucket before each request."""
+
+    def send(self, request, **kwargs):
+        bucket = _limits.get(_host(request.url))
+        if bucket is not None:
+            bucket.acquire()
+        return super().send(request, **kwargs)
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+_limits: dict[str, TokenBucket] = {h: TokenBucket(c["rate"], c["burst"]) for h, c in REGISTRY_LIMITS.items()}
+_pool_sizes: dict[str, int] = {h: c["pool"] for h, c in REGISTRY_LIMITS.items()}
+
+def _adapter(pool_size: int) -> HTTPAdapter:
+    return _PacedAdapter(pool_connections=MAX_HOST_POOLS, pool_maxsize=pool_size, max_retries=retry_policy())
+
+def _mount_host(s: requests.Session, host: str, size: int) -> None:
+    for scheme in ("https", "http"):
+        s.mount(f"{scheme}://{host}/", _adapter(size))
 
 def get_session() -> requests.Session:
     global _session
+    if _session is not None:
+        return _session
+    with _session_lock:
+        if _session is None:
+            s = requests.Session()
+            s.max_redirects = 5
+            s.mount("https://", _adapter(DEFAULT_POOL_SIZE))
+            s.mount("http://", _adapter(DEFAULT_POOL_SIZE))
+            for host, size in _pool_sizes.items():
+                _mount_host(s, host, size)
+            _session = s
+    return _session
+
+def set_rate_limit(url_or_host: str, rate: Optional[float], burst: int = 1) -> None:
+    """Pace requests to a host at `rate` per second (burst up to `burst`); None or 0 removes the limit."""
+    host = _host(url_or_host)
+    with _session_lock:
+        if rate:
+            _limits[host] = TokenBucket(rate, burst)
+        else:
+            _limits.pop(host, None)
+
+def set_pool_size(url_or_host: str, size: int) -> None:
+    """Keep up to `size` connections alive to one host (default DEFAULT_POOL_SIZE)."""
+    host = _host(url_or_host)
+    with _session_lock:
+        _pool_sizes[host] = size
+        if _session is not None:
+            _mount_host(_session, host, size)
+
+def pool_stats() -> dict[str, dict]:
+    """
+    Per-host connection reuse of the shared session: connections opened vs requests
+    sent. More requests than connections means keep-alive is working.
+    """
+    out: dict[str, dict] = {}
     if _session is None:
-        s = requests.Session()
-        s.max_redirects = 5
-        _session = s
-    return _session
\ No newline at end of file
+        return out
+    for adapter in set(_session.adapters.values()):
+        manager = getattr(adapter, "poolmanager", None)
+        if manager is None:
+            continue
+        for key in list(manager.pools.keys()):
+            pool = manager.pools.get(key)
+            if pool is None:
+                continue
+            host = f"{pool.host}:{pool.port}" if pool.port else pool.host
+            row = out.setdefault(host, {"connections": 0, "requests": 0})
+            row["connections"] += pool.num_connections
+            row["requests"] += pool.num_requests
+    return out
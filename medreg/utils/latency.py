@@ -0,0 +1,128 @@
+from __future__ import annotations
+import atexit
+import json
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Optional
+from urllib.parse import urlsplit
+
+from .cache import default_dir
+
+# Observed response times per registry endpoint, kept between runs, so request
+# timeouts follow what each endpoint usually needs instead of one global value.
+# An endpoint is a host plus path with numeric segments folded ("…/medicinal-
+# products/{n}/documents"). Samples are time to response headers, the span a
+# requests read timeout bounds; a request that timed out counts as a sample at
+# its timeout, so a slowing endpoint raises its own limit. New samples are merged
+# into the store at exit.
+
+STORE_NAME = "latency.json"
+MAX_SAMPLES = 200           # most recent samples kept per endpoint
+MIN_SAMPLES = 20            # below this the caller's timeout is used as is
+TIMEOUT_FACTOR = 4.0        # adaptive timeout = p99 x factor ...
+MIN_TIMEOUT = 2.0           # ... but never below this many seconds
+HEDGE_PERCENTILE = 95
+
+_NUMERIC = re.compile(r"/\d+(?=/|$)")
+
+_lock = threading.Lock()
+_samples: Optional[dict[str, list[float]]] = None
+_new: dict[str, list[float]] = {}
+_hedge = False
+_path: Optional[Path] = None
+
+def endpoint(url: str) -> str:
+    parts = urlsplit(url)
+    return parts.netloc.lower() + _NUMERIC.sub("/{n}", parts.path)
+
+def store_path() -> Path:
+    return _path or default_dir() / STORE_NAME
+
+def configure(*, hedge: Optional[bool] = None, path: Optional[str] = None) -> None:
+    """Turn hedged GETs on or off, or keep the store somewhere else (tests, benchmarks)."""
+    global _hedge, _path, _samples
+    with _lock:
+        if hedge is not None:
+            _hedge = hedge
+        if path is not None:
+            _path = Path(path)
+            _samples = None
+
+def hedging() -> bool:
+    return _hedge
+
+def _load() -> dict:
+    try:
+        store = json.loads(store_path().read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    return {k: v for k, v in store.get("endpoints", {}).items() if isinstance(v, list)}
+
+def _loaded() -> dict[str, list[float]]:
+    global _samples
+    if _samples is None:
+        _samples = _load()
+        atexit.register(save)
+    return _samples
+
+def record(url: str, seconds: float) -> None:
+    key = endpoint(url)
+    value = round(seconds, 4)
+    with _lock:
+        samples = _loaded().setdefault(key, [])
+        samples.append(value)
+        del samples[:-MAX_SAMPLES]
+        _new.setdefault(key, []).append(value)
+
+def percentile(url: str, pct: float) -> Optional[float]:
+    """pct-th percentile of the endpoint's recent samples, or None while there are too few."""
+    with _lock:
+        samples = list(_loaded().get(endpoint(url), ()))
+    if len(samples) < MIN_SAMPLES:
+        return None
+    return _at(sorted(samples), pct)
+
+def _at(ordered: list[float], pct: float) -> float:
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+def timeout_for(url: str, ceiling: float) -> float:
+    """Request timeout for url: a multiple of its p99, within [MIN_TIMEOUT, ceiling]."""
+    p99 = percentile(url, 99)
+    if p99 is None:
+        return ceiling
+    return min(ceiling, max(MIN_TIMEOUT, p99 * TIMEOUT_FACTOR))
+
+def hedge_delay(url: str) -> Optional[float]:
+    """Seconds after which a hedged GET sends its second request, or None (no hedging)."""
+    if not _hedge:
+        return None
+    return percentile(url, HEDGE_PERCENTILE)
+
+def stats() -> dict[str, dict]:
+    """Per endpoint: sample count and p50/p95/p99 in milliseconds."""
+    with _lock:
+        endpoints = {k: sorted(v) for k, v in _loaded().items() if v}
+    return {key: {"samples": len(s), **{f"p{pct}_ms": round(_at(s, pct) * 1000, 1) for pct in (50, 95, 99)}}
+            for key, s in endpoints.items()}
+
+def save() -> None:
+    """Merge this process's new samples into the store (other processes may have written since)."""
+    with _lock:
+        if not _new:
+            return
+        store = _load()
+        for key, values in _new.items():
+            samples = store.setdefault(key, [])
+            samples.extend(values)
+            del samples[:-MAX_SAMPLES]
+        _new.clear()
+        path = store_path()
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+            tmp.write_text(json.dumps({"version": 1, "endpoints": store}, separators=(",", ":")), encoding="utf-8")
+            os.replace(tmp, path)
+        except OSError:
+            pass
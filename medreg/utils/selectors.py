@@ -0,0 +1,84 @@
+from __future__ import annotations
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Optional
+
+from .cache import default_dir
+
+# Learned page-automation paths for the browser adapters: which selector, frame
+# or submit method worked last time, keyed by registry and a fingerprint of the
+# site's deployed scripts. A new deployment gets a new key, so stale knowledge
+# is never tried against a redesigned page.
+
+STORE_NAME = "selectors.json"
+MAX_VERSIONS = 4
+ABSENT = ""  # recorded for optional elements (e.g. cookie banners) that did not appear
+
+_SITE_VERSION_JS = """
+() => Array.from(document.scripts).map(s => s.src).filter(Boolean).sort().join('|')
+"""
+
+_lock = threading.Lock()
+
+def site_version(ctx) -> str:
+    try:
+        scripts = ctx.evaluate(_SITE_VERSION_JS)
+    except Exception:
+        scripts = ""
+    return hashlib.sha1(scripts.encode("utf-8")).hexdigest()[:12]
+
+class SelectorMemory:
+    def __init__(self, registry: str, version: str, *, path: Optional[Path] = None):
+        self.registry = registry
+        self.version = version
+        self.path = Path(path) if path else default_dir() / STORE_NAME
+        self._slots: dict[str, str] = {}
+        self._dirty = False
+        store = self._load()
+        self._slots = dict(store.get(registry, {}).get(version, {}))
+
+    def get(self, slot: str) -> Optional[str]:
+        return self._slots.get(slot)
+
+    def remember(self, slot: str, value: str) -> None:
+        if self._slots.get(slot) != value:
+            self._slots[slot] = value
+            self._dirty = True
+
+    def forget(self, slot: str) -> None:
+        if self._slots.pop(slot, None) is not None:
+            self._dirty = True
+
+    def reset(self) -> None:
+        """Drop everything learned for this site version, e.g. after a failed run."""
+        self._slots.clear()
+        self._dirty = True
+
+    def save(self) -> None:
+        if not self._dirty:
+            return
+        with _lock:
+            store = self._load()
+            versions = store.setdefault(self.registry, {})
+            versions.pop(self.version, None)
+            versions[self.version] = self._slots
+            # Keep only the most recently written versions (dicts preserve insertion order)
+            for old in list(versions)[:-MAX_VERSIONS]:
+                del versions[old]
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+                tmp.write_text(json.dumps(store, indent=1), encoding="utf-8")
+                os.replace(tmp, self.path)
+            except OSError:
+                return
+        self._dirty = False
+
+    def _load(self) -> dict:
+        try:
+            return json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
@@ -0,0 +1,15 @@
+from __future__ import annotations
+import re
+import unicodedata
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+# Letters that have no combining-mark decomposition
+_EXTRA = str.maketrans({"ł": "l", "ø": "o", "đ": "d", "ß": "ss", "æ": "ae", "œ": "oe"})
+
+def fold(text: str) -> str:
+    """Lowercase and strip accents: 'Paracétamol' -> 'paracetamol'."""
+    decomposed = unicodedata.normalize("NFKD", text or "")
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch)).lower().translate(_EXTRA)
+
+def words(text: str) -> list[str]:
+    return _WORD_RE.findall(fold(text))
@@ -0,0 +1,124 @@
+from __future__ import annotations
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import IO
+
+# Lightweight span recorder behind --profile / --trace. Disabled by default:
+# span() then returns a shared no-op object, so instrumented code pays one
+# function call and a flag check.
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs) -> None:
+        pass
+
+_NOOP = _NoopSpan()
+
+class Span:
+    __slots__ = ("name", "attrs", "start", "end", "tid")
+
+    def __init__(self, name: str, attrs: dict):
+        self.name = name
+        self.attrs = attrs
+        self.start = 0.0
+        self.end = 0.0
+        self.tid = 0
+
+    def __enter__(self):
+        self.tid = threading.get_ident()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end = time.perf_counter()
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        _spans.append(self)
+        return False
+
+    def set(self, **attrs) -> None:
+        self.attrs.update(attrs)
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+_enabled = False
+_origin = 0.0
+_spans: list[Span] = []
+
+def enable() -> None:
+    global _enabled, _origin
+    _enabled = True
+    _origin = time.perf_counter()
+    _spans.clear()
+
+def enabled() -> bool:
+    return _enabled
+
+def span(name: str, **attrs):
+    if not _enabled:
+        return _NOOP
+    return Span(name, attrs)
+
+def spans() -> list[Span]:
+    return sorted(_spans, key=lambda s: s.start)
+
+def summary() -> list[dict]:
+    """Per span name: count, total and max time, bytes, cache outcomes and HTTP phase split."""
+    rows: dict[str, dict] = defaultdict(lambda: {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "bytes": 0})
+    for s in _spans:
+        row = rows[s.name]
+        ms = s.duration * 1000
+        row["count"] += 1
+        row["total_ms"] += ms
+        row["max_ms"] = max(row["max_ms"], ms)
+        row["bytes"] += s.attrs.get("bytes") or 0
+        for phase in ("ttfb_ms", "body_ms"):
+            if phase in s.attrs:
+                row[phase] = row.get(phase, 0.0) + s.attrs[phase]
+        if "cache" in s.attrs:
+            cache = row.setdefault("cache", {})
+            cache[s.attrs["cache"]] = cache.get(s.attrs["cache"], 0) + 1
+    return [dict(name=name, **row) for name, row in sorted(rows.items(), key=lambda kv: -kv[1]["total_ms"])]
+
+def print_summary(out: IO[str]) -> None:
+    wall = (time.perf_counter() - _origin) * 1000
+    print(f"\nProfile (wall {wall:.1f} ms; phases overlap when requests run concurrently)", file=out)
+    print(f"  {'phase':24} {'count':>5} {'total ms':>10} {'max ms':>9} {'bytes':>10}  details", file=out)
+    for row in summary():
+        details = []
+        if "ttfb_ms" in row:
+            details.append(f"ttfb {row['ttfb_ms']:.1f} ms, body {row['body_ms']:.1f} ms")
+        if "cache" in row:
+            details.append("cache " + ", ".join(f"{k}={v}" for k, v in sorted(row["cache"].items())))
+        print(f"  {row['name']:24} {row['count']:5d} {row['total_ms']:10.1f} {row['max_ms']:9.1f} {row['bytes']:10d}  "
+              + "; ".join(details), file=out)
+
+def export(path: str, fmt: str = "json") -> None:
+    """Write recorded spans as plain JSON or as Chrome trace events (chrome://tracing, Perfetto)."""
+    if fmt == "chrome":
+        pid = os.getpid()
+        doc = {"traceEvents": [
+            {"name": s.name, "ph": "X", "pid": pid, "tid": s.tid,
+             "ts": round((s.start - _origin) * 1e6, 1), "dur": round(s.duration * 1e6, 1), "args": s.attrs}
+            for s in spans()
+        ]}
+    else:
+        doc = {"spans": [
+            {"name": s.name, "start_ms": round((s.start - _origin) * 1000, 3),
+             "duration_ms": round(s.duration * 1000, 3), "thread": s.tid, **s.attrs}
+            for s in spans()
+        ]}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(doc, f, ensure_ascii=False, default=str)